@@ -1,235 +1,2814 @@
+import import_profile
+
+# Installed before anything else is imported so the report covers streamlit too
+import_profile.enable_from_env()
+
 import streamlit as st
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain_groq import ChatGroq
-from langchain.memory import ConversationBufferMemory
+from collections import Counter, OrderedDict, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
 from datetime import datetime
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
 import time
 import random
+import re
+
+
+class ResponseCache:
+    """Persistent on-disk cache of LLM completions.
+
+    Entries are keyed by model, temperature, the fully rendered prompt and a
+    date bucket, expire after ``ttl_seconds`` and are evicted least-recently-used
+    once more than ``max_entries`` are stored.
+    """
+
+    def __init__(self, path=".blog_cache.sqlite3", ttl_seconds=24 * 60 * 60, max_entries=500):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name, temperature, prompt_text, date_bucket=None):
+        """Build a content-addressed key for a rendered prompt"""
+        if date_bucket is None:
+            date_bucket = datetime.now().strftime("%Y-%m-%d")
+        raw = "\x1f".join([model_name, str(temperature), date_bucket, prompt_text])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached completion for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        """Store a completion and evict the least recently used overflow"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Remove every cached completion and reset the counters"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+
+@dataclass
+class Artifact:
+    """A generated artifact and the inputs revision it was computed from"""
+    name: str
+    value: object
+    inputs_hash: str
+    inputs: dict
+    version: int
+    created_at: datetime = field(default_factory=datetime.now)
+    served_by: str = None
+    # In-place edits (e.g. rewritten sections) since the value was generated from its inputs
+    edits: int = 0
+
+
+class ArtifactStore:
+    """Versioned per-session store of generated artifacts.
+
+    Each artifact is computed at most once per revision of its inputs: a lookup
+    with different inputs than the stored revision counts as stale, so editing
+    an upstream value (topic, title, keywords, blog) invalidates everything
+    derived from it without any manual bookkeeping.
+    """
+
+    def __init__(self, on_put=None):
+        self._artifacts = {}
+        self.compute_counts = Counter()
+        # Called with every freshly stored Artifact (e.g. to archive it)
+        self.on_put = on_put
+
+    @staticmethod
+    def fingerprint(inputs):
+        """Hash the inputs an artifact was derived from"""
+        raw = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_artifact(self, name, **inputs):
+        """Return the Artifact for these inputs, or None if missing or stale"""
+        artifact = self._artifacts.get(name)
+        if artifact is None or artifact.inputs_hash != self.fingerprint(inputs):
+            return None
+        return artifact
+
+    def get(self, name, **inputs):
+        """Return the stored value for these inputs, or None if missing or stale"""
+        artifact = self.get_artifact(name, **inputs)
+        return artifact.value if artifact else None
+
+    def latest(self, name):
+        """Return the most recent Artifact for name regardless of its inputs"""
+        return self._artifacts.get(name)
+
+    def put(self, name, value, served_by=None, edits=0, **inputs):
+        """Store a freshly generated value as the current revision.
+
+        ``served_by`` records the model that generated the value and ``edits``
+        how many in-place edits it carries; neither is part of the fingerprint,
+        so an edited value still matches the inputs it was generated from.
+        """
+        previous = self._artifacts.get(name)
+        self.compute_counts[name] += 1
+        artifact = Artifact(
+            name=name,
+            value=value,
+            inputs_hash=self.fingerprint(inputs),
+            inputs=inputs,
+            version=previous.version + 1 if previous else 1,
+            served_by=served_by,
+            edits=edits
+        )
+        self._artifacts[name] = artifact
+        if self.on_put is not None:
+            self.on_put(artifact)
+        return artifact
+
+    def compute(self, name, compute_fn, force=False, served_by=None, **inputs):
+        """Return the artifact value, calling compute_fn only when it is stale.
+
+        ``force=True`` recomputes even when the stored revision is current.
+        ``served_by`` is called after compute_fn to name the model that served it.
+        """
+        if not force:
+            artifact = self.get_artifact(name, **inputs)
+            if artifact is not None:
+                return artifact.value
+        value = compute_fn()
+        self.put(name, value, served_by=served_by() if served_by else None, **inputs)
+        return value
+
+    def invalidate(self, name):
+        """Drop an artifact so the next compute call regenerates it"""
+        self._artifacts.pop(name, None)
+
+    def summary(self):
+        """Return (name, version, compute count, served by) for every stored artifact"""
+        return [
+            (name, artifact.version, self.compute_counts[name], artifact.served_by)
+            for name, artifact in self._artifacts.items()
+        ]
+
+
+# Words ignored when comparing topics
+TOPIC_STOPWORDS = {
+    "a", "an", "and", "are", "for", "from", "how", "in", "is", "of", "on", "or", "the", "to", "vs", "what",
+    "why", "with", "your",
+}
+
+
+def topic_tokens(text):
+    """Normalized content words of a topic, used for near-duplicate matching"""
+    tokens = set()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in TOPIC_STOPWORDS:
+            continue
+        # Crude singularisation so "EV batteries" matches "EV battery"
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.add(word)
+    return tokens
+
+
+def jaccard(left, right):
+    """Token-overlap similarity of two sets (0 to 1)"""
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+class ContentArchive:
+    """Persistent, full-text searchable archive of generated content.
+
+    Research reports, title sets, keyword lists and blog posts are stored in
+    SQLite with an FTS5 index over topic, title and content, so past work can
+    be searched and research for a near-identical topic reused instead of
+    generated again. Falls back to LIKE queries when SQLite lacks FTS5.
+
+    Every document belongs to the ``account`` (API key hash) that generated it
+    and is only visible to lookups for that account, so sessions sharing the
+    process never see each other's content.
+    """
+
+    # Artifact names that are archived, mapped to the kind they are stored as
+    ARCHIVED_ARTIFACTS = {"research": "research", "titles": "titles", "keywords": "keywords", "blog": "post"}
+
+    def __init__(self, path=".blog_archive.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id INTEGER PRIMARY KEY, kind TEXT NOT NULL, topic TEXT NOT NULL, title TEXT NOT NULL, "
+            "content TEXT NOT NULL, content_hash TEXT NOT NULL, model TEXT, created REAL NOT NULL, account TEXT, "
+            "UNIQUE (kind, content_hash))"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(documents)")]
+        if "account" not in columns:
+            # Archives created before documents were scoped; their rows stay unowned
+            self._conn.execute("ALTER TABLE documents ADD COLUMN account TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_kind ON documents (kind, created)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_account ON documents (account, kind, created)")
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+                "topic, title, content, content='documents', content_rowid='id', tokenize='porter unicode61')"
+            )
+            self.full_text = True
+        except sqlite3.OperationalError:
+            self.full_text = False
+        self._conn.commit()
+
+    def save(self, kind, topic, content, title="", model=None, account=None):
+        """Archive a document; identical content of the same kind is stored once per account.
+
+        List content (titles, keywords) is stored one item per line.
+        """
+        if isinstance(content, (list, tuple)):
+            content = "\n".join(content)
+        # The account is part of the hash so the uniqueness constraint applies per account
+        content_hash = hashlib.sha256(f"{account or ''}\0{content}".encode("utf-8")).hexdigest()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO documents "
+                "(kind, topic, title, content, content_hash, model, created, account) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, topic, title, content, content_hash, model, time.time(), account)
+            )
+            if cursor.rowcount and self.full_text:
+                self._conn.execute(
+                    "INSERT INTO documents_fts (rowid, topic, title, content) VALUES (?, ?, ?, ?)",
+                    (cursor.lastrowid, topic, title, content)
+                )
+            self._conn.commit()
+
+    def record_artifact(self, artifact, account=None):
+        """ArtifactStore ``on_put`` hook archiving the artifact kinds worth keeping"""
+        kind = self.ARCHIVED_ARTIFACTS.get(artifact.name)
+        if kind is None or not artifact.value:
+            return
+        topic = artifact.inputs.get("topic") or artifact.inputs.get("title", "")
+        self.save(
+            kind, topic, artifact.value, title=artifact.inputs.get("title", ""), model=artifact.served_by,
+            account=account
+        )
+
+    def _rows(self, sql, params):
+        columns = ("id", "kind", "topic", "title", "snippet", "model", "created")
+        with self._lock:
+            return [dict(zip(columns, row)) for row in self._conn.execute(sql, params).fetchall()]
+
+    def search(self, query, kind=None, limit=20, account=None):
+        """Return the account's best matching documents (without their full content), most relevant first"""
+        words = re.findall(r"\w+", query.lower())
+        if not words:
+            return []
+        filters = " AND d.account IS ?" + (" AND d.kind = ?" if kind else "")
+        filter_params = (account, kind) if kind else (account,)
+        if self.full_text:
+            match = " ".join(f'"{word}"*' for word in words)
+            return self._rows(
+                "SELECT d.id, d.kind, d.topic, d.title, snippet(documents_fts, 2, '**', '**', '...', 24), "
+                "d.model, d.created FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+                f"WHERE documents_fts MATCH ?{filters} ORDER BY bm25(documents_fts, 4.0, 2.0, 1.0) LIMIT ?",
+                (match, *filter_params, limit)
+            )
+        conditions = " AND ".join("(d.topic || ' ' || d.title || ' ' || d.content) LIKE ?" for _ in words)
+        return self._rows(
+            "SELECT d.id, d.kind, d.topic, d.title, substr(d.content, 1, 200), d.model, d.created "
+            f"FROM documents d WHERE {conditions}{filters} ORDER BY d.created DESC LIMIT ?",
+            (*[f"%{word}%" for word in words], *filter_params, limit)
+        )
+
+    def content(self, document_id, account=None):
+        """Return the full content of one of the account's archived documents"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM documents WHERE id = ? AND account IS ?", (document_id, account)
+            ).fetchone()
+        return row[0] if row else None
+
+    def similar(self, topic, kind="research", threshold=0.5, limit=3, account=None):
+        """Archived documents whose topic overlaps ``topic`` by at least ``threshold`` (Jaccard).
+
+        Returns dicts from ``search`` with an added ``similarity``, best and
+        newest first.
+        """
+        tokens = topic_tokens(topic)
+        if not tokens:
+            return []
+        if self.full_text:
+            words = set(re.findall(r"[a-z0-9]+", topic.lower())) - TOPIC_STOPWORDS
+            match = " OR ".join(f'topic : "{word}"*' for word in words)
+            candidates = self._rows(
+                "SELECT d.id, d.kind, d.topic, d.title, '', d.model, d.created "
+                "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+                "WHERE documents_fts MATCH ? AND d.kind = ? AND d.account IS ? ORDER BY d.created DESC LIMIT 200",
+                (match, kind, account)
+            )
+        else:
+            candidates = self._rows(
+                "SELECT id, kind, topic, title, '', model, created FROM documents "
+                "WHERE kind = ? AND account IS ? ORDER BY created DESC LIMIT 1000",
+                (kind, account)
+            )
+        matches = []
+        seen_topics = set()
+        for candidate in candidates:
+            similarity = jaccard(tokens, topic_tokens(candidate["topic"]))
+            if similarity >= threshold and candidate["topic"] not in seen_topics:
+                seen_topics.add(candidate["topic"])
+                matches.append(dict(candidate, similarity=similarity))
+        matches.sort(key=lambda match: (-match["similarity"], -match["created"]))
+        return matches[:limit]
+
+    def stats(self, account=None):
+        """Return the number of the account's archived documents per kind"""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT kind, COUNT(*) FROM documents WHERE account IS ? GROUP BY kind", (account,)
+            ).fetchall())
+
+
+class KeywordPrefetcher:
+    """Speculatively generates keywords for every suggested title of a session.
+
+    At most ``max_concurrent`` prefetches run at once; switching to a new topic
+    cancels whatever has not started yet and discards everything fetched for
+    the old one.
+    """
+
+    def __init__(self, max_concurrent=2):
+        self.max_concurrent = max_concurrent
+        self.topic = None
+        self.started = 0
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="keyword-prefetch")
+
+    def set_topic(self, topic):
+        """Cancel outstanding prefetches if the topic changed"""
+        with self._lock:
+            if topic == self.topic:
+                return
+            self.topic = topic
+            for future in self._futures.values():
+                future.cancel()
+            self._futures = {}
+
+    def prefetch(self, topic, titles, generate_fn):
+        """Queue ``generate_fn(title)`` for every title not already fetched"""
+        self.set_topic(topic)
+        with self._lock:
+            for title in titles:
+                if title not in self._futures:
+                    self._futures[title] = self._executor.submit(generate_fn, title)
+                    self.started += 1
+
+    def result(self, title, timeout=0):
+        """Return what ``generate_fn`` produced for title, waiting up to ``timeout`` seconds.
+
+        Returns None if nothing was prefetched, the prefetch failed or it is
+        still running when the timeout expires (``timeout=None`` waits).
+        """
+        with self._lock:
+            future = self._futures.get(title)
+        if future is None or future.cancelled():
+            return None
+        if timeout == 0 and not future.done():
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            return None
+
+    def pending(self):
+        """Number of prefetches queued or running"""
+        with self._lock:
+            return sum(1 for future in self._futures.values() if not future.done())
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested"""
+
+
+@dataclass
+class Job:
+    """A generation running on the background JobRunner"""
+    id: str
+    owner: str
+    name: str
+    status: str = "queued"
+    progress: float = 0.0
+    message: str = ""
+    partial: str = ""
+    result: object = None
+    error: str = None
+    created: float = field(default_factory=time.time)
+    finished: float = None
+    cancel_requested: bool = False
+    future: object = field(default=None, repr=False)
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def report(self, progress=None, message=None, partial=None):
+        """Update progress from inside the job; raises JobCancelled once cancelled"""
+        if self.cancel_requested:
+            raise JobCancelled()
+        if progress is not None:
+            self.progress = min(1.0, max(0.0, progress))
+        if message is not None:
+            self.message = message
+        if partial is not None:
+            self.partial = partial
+
+
+class JobRunner:
+    """Process-wide pool running generation jobs outside the Streamlit script.
+
+    Jobs keep running across reruns and tab switches, so a paid completion is
+    never thrown away because the user clicked something. Every session shares
+    ``max_workers`` threads. A job is ``fn(job)``; it reports progress through
+    ``job.report`` and its return value is passed to ``on_done`` on the worker
+    thread (e.g. to store it in the session's ArtifactStore). Cancellation is
+    cooperative: queued jobs are dropped, running ones stop at their next report.
+    Finished jobs are forgotten after ``keep_seconds``.
+    """
+
+    def __init__(self, max_workers=4, keep_seconds=15 * 60):
+        self.keep_seconds = keep_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation-job")
+
+    def submit(self, owner, name, fn, on_done=None):
+        """Queue a job for ``owner`` (a session id) and return it"""
+        job = Job(id=os.urandom(8).hex(), owner=owner, name=name)
+        with self._lock:
+            self._purge()
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(self._execute, job, fn, on_done)
+        return job
+
+    def _execute(self, job, fn, on_done):
+        if job.cancel_requested:
+            job.status = "cancelled"
+            job.finished = time.time()
+            return
+        job.status = "running"
+        try:
+            result = fn(job)
+            job.progress = 1.0
+            if on_done is not None:
+                on_done(result)
+            job.result = result
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        job.finished = time.time()
+
+    def _purge(self):
+        cutoff = time.time() - self.keep_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, owner, active_only=False):
+        """Jobs of an owner, oldest first"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.owner == owner]
+        if active_only:
+            jobs = [job for job in jobs if job.active]
+        return sorted(jobs, key=lambda job: job.created)
+
+    def latest(self, owner, name):
+        """The most recently submitted job called ``name`` for an owner, if any"""
+        jobs = [job for job in self.jobs(owner) if job.name == name]
+        return jobs[-1] if jobs else None
+
+    def cancel(self, job_id):
+        """Request cancellation of a job"""
+        job = self.get(job_id)
+        if job is None or not job.active:
+            return
+        job.cancel_requested = True
+        if job.future is not None and job.future.cancel():
+            job.status = "cancelled"
+            job.finished = time.time()
+
+    def stats(self):
+        """Number of jobs per status across all owners"""
+        with self._lock:
+            return dict(Counter(job.status for job in self._jobs.values()))
+
+
+def drain_stream(job, stream, expected_tokens, publish_every=0.25):
+    """Consume a TokenStream inside a job, publishing partial text and progress.
+
+    Returns the full completion; stops with JobCancelled once the job is cancelled.
+    """
+    parts = []
+    published = 0.0
+    for token in stream:
+        parts.append(token)
+        if time.monotonic() - published >= publish_every:
+            partial = "".join(parts)
+            job.report(progress=min(0.95, estimate_tokens(partial) / expected_tokens), partial=partial)
+            published = time.monotonic()
+    return stream.text
+
+
+def parse_titles(text):
+    """Split a numbered title list into plain titles"""
+    titles = [line.strip() for line in text.split('\n') if line.strip()]
+    # Handle both "1. Title" and "Title" formats
+    return [title.split('. ', 1)[1] if '. ' in title else title for title in titles]
+
+
+def parse_keywords(text):
+    """Split a comma- or line-separated keyword list into plain keywords"""
+    return [keyword.strip() for keyword in re.split(r"[,\n]", text) if keyword.strip()]
+
+
+def keyword_text(keywords):
+    """Render keywords as the comma-separated text the writing prompts expect"""
+    return keywords if isinstance(keywords, str) else ", ".join(keywords)
+
+
+# JSON schemas the structured stages answer with: an object holding one list of strings
+STRUCTURED_OUTPUT_SCHEMAS = {
+    "titles": {
+        "type": "object",
+        "properties": {"titles": {"type": "array", "items": {"type": "string"}, "minItems": 1, "maxItems": 5}},
+        "required": ["titles"],
+    },
+    "keywords": {
+        "type": "object",
+        "properties": {"keywords": {"type": "array", "items": {"type": "string"}, "minItems": 1, "maxItems": 15}},
+        "required": ["keywords"],
+    },
+}
+
+
+def parse_structured_list(text, schema):
+    """Validate a model's JSON answer against a list schema and return the list.
+
+    Code fences and text around the JSON object are ignored, blank and
+    duplicate items dropped and extra items beyond ``maxItems`` cut off.
+    Raises ValueError describing what is wrong otherwise.
+    """
+    key = schema["required"][0]
+    spec = schema["properties"][key]
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("no JSON object found")
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON ({e})")
+    if not isinstance(data, dict) or key not in data:
+        raise ValueError(f'expected an object with a "{key}" key')
+    values = data[key]
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise ValueError(f'"{key}" must be a list of strings')
+    items = list(dict.fromkeys(value.strip() for value in values if value.strip()))
+    if len(items) < spec.get("minItems", 0):
+        raise ValueError(f'"{key}" needs at least {spec["minItems"]} non-empty items')
+    return items[:spec.get("maxItems", len(items))]
+
+
+def recover_structured_list(text, schema):
+    """Leniently pull the quoted items of a schema's list out of malformed JSON.
+
+    Reads the strings after ``"<key>": [`` one at a time, so trailing commas
+    or a missing closing bracket do not lose them. Returns an empty list when
+    the list cannot be found.
+    """
+    key = schema["required"][0]
+    start = re.search(r'"%s"\s*:\s*\[' % re.escape(key), text)
+    if start is None:
+        return []
+    item_pattern = re.compile(r'\s*"((?:[^"\\]|\\.)*)"\s*,?')
+    values = []
+    position = start.end()
+    while True:
+        match = item_pattern.match(text, position)
+        if match is None:
+            break
+        try:
+            values.append(json.loads(f'"{match.group(1)}"'))
+        except json.JSONDecodeError:
+            values.append(match.group(1))
+        position = match.end()
+    items = list(dict.fromkeys(value.strip() for value in values if value.strip()))
+    return items[:schema["properties"][key].get("maxItems", len(items))]
+
+
+def format_research_report(research):
+    """Prefix research output with its generation date"""
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    return f"# Research Report (Generated {current_date})\n\n" + research
+
+
+def stamp_blog(blog_content):
+    """Prefix a generated blog with an HTML comment recording its generation date"""
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    return f"<!-- Generated on {current_date} -->\n\n" + blog_content
+
+
+def prepare_qa_source(blog_content):
+    """Strip HTML comments and any existing FAQ section before generating Q&A"""
+    content = re.sub(r"<!--.*?-->", "", blog_content, flags=re.S)
+    faq = re.search(r"^#{2,3}\s+Frequently Asked Questions.*$", content, flags=re.M | re.I)
+    if faq:
+        content = content[:faq.start()]
+    return content.strip()
+
+
+def split_markdown_sections(markdown, levels=(2, 3)):
+    """Split markdown into sections that each start at an H2/H3 heading.
+
+    Text before the first heading (title, intro) becomes its own section.
+    Headings inside fenced code blocks are ignored.
+    """
+    heading_pattern = re.compile(r"^(#{%d,%d})\s+\S" % (min(levels), max(levels)))
+    sections = []
+    current = []
+    in_code = False
+    for line in markdown.split("\n"):
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        if not in_code and heading_pattern.match(line) and current:
+            sections.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("\n".join(current))
+    return [section for section in sections if section.strip()]
+
+
+def chunk_sections(sections, max_tokens):
+    """Pack consecutive sections into chunks of at most roughly max_tokens.
+
+    Sections larger than the budget on their own are split by paragraph.
+    """
+    pieces = []
+    for section in sections:
+        if estimate_tokens(section) <= max_tokens:
+            pieces.append(section)
+            continue
+        paragraph_chunk = []
+        for paragraph in section.split("\n\n"):
+            if paragraph_chunk and estimate_tokens("\n\n".join(paragraph_chunk + [paragraph])) > max_tokens:
+                pieces.append("\n\n".join(paragraph_chunk))
+                paragraph_chunk = []
+            paragraph_chunk.append(paragraph)
+        if paragraph_chunk:
+            pieces.append("\n\n".join(paragraph_chunk))
+
+    chunks = []
+    for piece in pieces:
+        if chunks and estimate_tokens(chunks[-1] + "\n\n" + piece) <= max_tokens:
+            chunks[-1] += "\n\n" + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def parse_outline(text):
+    """Parse an outline into (heading, notes) pairs, one per H2 section.
+
+    Introduction, conclusion and references headings are dropped because the
+    long-form engine writes those parts itself.
+    """
+    outline = []
+    for section in split_markdown_sections(text, levels=(2, 2)):
+        lines = section.strip().split("\n")
+        if not lines[0].startswith("## "):
+            continue
+        heading = lines[0][3:].strip().strip("*")
+        if re.match(r"(introduction|conclusion|references|sources)\b", heading, flags=re.I):
+            continue
+        outline.append((heading, "\n".join(line.strip() for line in lines[1:] if line.strip())))
+    return outline
+
+
+def replace_section(markdown, index, new_section):
+    """Return ``markdown`` with its ``index``-th H2 section replaced by ``new_section``.
+
+    Sections are numbered as returned by ``split_markdown_sections(markdown,
+    levels=(2,))``; the whitespace that separated the old section from the
+    next one is kept.
+    """
+    sections = split_markdown_sections(markdown, levels=(2,))
+    old_section = sections[index]
+    sections[index] = new_section.strip() + old_section[len(old_section.rstrip()):]
+    return "\n".join(sections)
+
+
+def collect_references(sections):
+    """Return the unique markdown links in ``sections``, in order of first use"""
+    references = {}
+    for section in sections:
+        for name, url in re.findall(r"\[([^\]]+)\]\((https?://[^)\s]+)\)", section):
+            references.setdefault(url.rstrip("/"), (name, url))
+    return list(references.values())
+
+
+def run_stage_graph(stages, max_workers=2, completed=None, on_complete=None):
+    """Run a dependency graph of stages, overlapping the independent ones.
+
+    ``stages`` maps a stage name to ``(dependencies, fn)`` where ``fn`` receives
+    the dict of results produced so far. Stages already present in
+    ``completed`` are skipped, and ``on_complete(name, value, seconds)`` is
+    called as each remaining stage finishes. Returns ``(results, timings)``
+    with per-stage wall time in seconds. Once a stage fails no new stages
+    are started, but the ones already running are waited for (and reported to
+    ``on_complete`` if they succeed, so their paid-for output can be
+    checkpointed) before the first error is re-raised.
+    """
+    results = dict(completed or {})
+    timings = {}
+    pending = {name: stage for name, stage in stages.items() if name not in results}
+
+    def timed(name, fn, snapshot):
+        start = time.perf_counter()
+        value = fn(snapshot)
+        return name, value, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = set()
+        error = None
+        while (pending and error is None) or running:
+            if error is None:
+                ready = [name for name, (deps, _) in pending.items() if all(dep in results for dep in deps)]
+                for name in ready:
+                    _, fn = pending.pop(name)
+                    running.add(executor.submit(timed, name, fn, dict(results)))
+                if not running:
+                    raise ValueError(f"Unsatisfiable stage dependencies: {sorted(pending)}")
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    name, value, elapsed = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                results[name] = value
+                timings[name] = elapsed
+                if on_complete is not None:
+                    on_complete(name, value, elapsed)
+    if error is not None:
+        raise error
+    return results, timings
+
+
+# Per-minute request and token budgets for each supported model (Groq free tier)
+MODEL_LIMITS = {
+    "llama3-70b-8192": {"requests_per_minute": 30, "tokens_per_minute": 6000},
+    "llama-3.3-70b-versatile": {"requests_per_minute": 30, "tokens_per_minute": 6000},
+    "gemma-7b-it": {"requests_per_minute": 30, "tokens_per_minute": 15000},
+}
+DEFAULT_MODEL_LIMITS = {"requests_per_minute": 30, "tokens_per_minute": 6000}
+
+# Context window sizes in tokens
+MODEL_CONTEXT_TOKENS = {
+    "llama3-70b-8192": 8192,
+    "llama-3.3-70b-versatile": 128000,
+    "gemma-7b-it": 8192,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+
+# Long-form posts get one outline section per this many words (within the bounds below)
+LONG_FORM_WORDS_PER_SECTION = 450
+LONG_FORM_SECTION_BOUNDS = (3, 10)
+# Words reserved for the separately written introduction and conclusion
+LONG_FORM_FRAME_WORDS = 300
+# Research excerpt shared with every long-form prompt, in tokens
+LONG_FORM_RESEARCH_TOKENS = 1200
+
+# Share of the context window a single Q&A prompt may use before switching to map-reduce
+QA_CONTEXT_FRACTION = 0.5
+
+# USD per million (prompt, completion) tokens, used for cost estimates
+MODEL_PRICING = {
+    "llama3-70b-8192": (0.59, 0.79),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "gemma-7b-it": (0.07, 0.07),
+}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (roughly four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def is_retryable_error(error):
+    """Whether an LLM error is worth retrying (rate limits, server and network errors)"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return any(name in type(error).__name__ for name in ("RateLimit", "Connection", "Timeout"))
+
+
+def retry_after_seconds(error):
+    """Return the Retry-After delay carried by an API error, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_decommissioned_error(error):
+    """Whether an LLM error means the model itself is gone (retired or unknown)"""
+    message = str(error).lower()
+    return (
+        getattr(error, "status_code", None) == 404
+        or "decommissioned" in message
+        or "model_not_found" in message
+    )
+
+
+class TokenBucket:
+    """Continuously refilling budget of ``capacity`` units per minute"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.available = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def seconds_until(self, amount):
+        """Seconds until ``amount`` units are available (0 if they already are)"""
+        self.refill()
+        missing = min(amount, self.capacity) - self.available
+        return max(0.0, missing * 60 / self.capacity)
+
+    def take(self, amount):
+        self.available -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.available = min(self.capacity, self.available + amount)
+
+
+class RateLimiter:
+    """Client-side limiter shared by every session calling Groq.
+
+    Each (account, model) pair gets a request bucket and a token bucket sized
+    from MODEL_LIMITS. Callers are served strictly first-come first-served, so
+    one busy session cannot starve the others. Retryable failures are retried
+    with jittered exponential backoff, honouring Retry-After when the API sends
+    it. Queue-wait time and retry counts are kept per model.
+    """
+
+    def __init__(self, max_retries=4, base_delay=1.0, max_delay=30.0, limits=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limits = limits or MODEL_LIMITS
+        self._condition = threading.Condition()
+        self._buckets = {}
+        self._next_ticket = Counter()
+        self._serving = Counter()
+        self._stats = {}
+
+    def _model_stats(self, model_name):
+        return self._stats.setdefault(model_name, {
+            "requests": 0, "retries": 0, "failures": 0, "queue_wait": 0.0, "max_queue_wait": 0.0
+        })
+
+    def acquire(self, model_name, tokens, account=None):
+        """Block until the budget allows a call of ``tokens`` tokens; return the wait in seconds"""
+        key = (account, model_name)
+        start = time.monotonic()
+        with self._condition:
+            if key not in self._buckets:
+                limits = self.limits.get(model_name, DEFAULT_MODEL_LIMITS)
+                self._buckets[key] = (
+                    TokenBucket(limits["requests_per_minute"]),
+                    TokenBucket(limits["tokens_per_minute"])
+                )
+            requests_bucket, tokens_bucket = self._buckets[key]
+            ticket = self._next_ticket[key]
+            self._next_ticket[key] += 1
+            while True:
+                if self._serving[key] == ticket:
+                    delay = max(requests_bucket.seconds_until(1), tokens_bucket.seconds_until(tokens))
+                    if delay == 0:
+                        requests_bucket.take(1)
+                        tokens_bucket.take(tokens)
+                        self._serving[key] += 1
+                        self._condition.notify_all()
+                        break
+                    self._condition.wait(delay)
+                else:
+                    self._condition.wait()
+            waited = time.monotonic() - start
+            stats = self._model_stats(model_name)
+            stats["requests"] += 1
+            stats["queue_wait"] += waited
+            stats["max_queue_wait"] = max(stats["max_queue_wait"], waited)
+        return waited
+
+    def settle(self, model_name, reserved, used, account=None):
+        """Correct the token bucket once the real size of a call is known"""
+        with self._condition:
+            buckets = self._buckets.get((account, model_name))
+            if buckets is not None:
+                buckets[1].give_back(reserved - used)
+                self._condition.notify_all()
+
+    def backoff_delay(self, attempt, error):
+        """Full-jitter exponential backoff, never shorter than Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _record_retry(self, model_name, gave_up):
+        with self._condition:
+            stats = self._model_stats(model_name)
+            stats["failures" if gave_up else "retries"] += 1
+
+    def call(self, model_name, tokens, fn, account=None, max_retries=None):
+        """Run ``fn()`` within the budget, retrying retryable failures.
+
+        A failed attempt gives its token reservation back, so retries do not
+        drain the bucket for tokens that were never generated.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            self.acquire(model_name, tokens, account=account)
+            try:
+                return fn()
+            except Exception as e:
+                self.settle(model_name, tokens, 0, account=account)
+                gave_up = attempt == max_retries or not is_retryable_error(e)
+                self._record_retry(model_name, gave_up)
+                if gave_up:
+                    raise
+                time.sleep(self.backoff_delay(attempt, e))
+
+    def stream(self, model_name, tokens, start_fn, account=None, max_retries=None):
+        """Yield from ``start_fn()`` within the budget.
+
+        Failures are only retried before the first chunk has been yielded, so
+        a consumer never sees duplicated output. Those attempts give their token
+        reservation back; a stream that broke off midway keeps it, since part
+        of it was generated.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            self.acquire(model_name, tokens, account=account)
+            started = False
+            try:
+                for chunk in start_fn():
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if not started:
+                    self.settle(model_name, tokens, 0, account=account)
+                gave_up = started or attempt == max_retries or not is_retryable_error(e)
+                self._record_retry(model_name, gave_up)
+                if gave_up:
+                    raise
+                time.sleep(self.backoff_delay(attempt, e))
+
+    def stats(self):
+        """Return a copy of the per-model counters"""
+        with self._condition:
+            return {model_name: dict(stats) for model_name, stats in self._stats.items()}
+
+
+class InFlightCall:
+    """State shared by every caller attached to one coalesced LLM call"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.chunks = []
+        self.finished = False
+        self.value = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """Single-flight deduplication of identical LLM calls across sessions.
+
+    While a call is in flight, identical requests (same API key, model,
+    temperature, stage, normalized inputs and day) attach to it instead of spending quota
+    of their own: ``run`` callers receive the leader's result and ``stream``
+    callers read the same tokens as they arrive. ``saved`` counts the calls
+    that were avoided per stage.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.leaders = Counter()
+        self.saved = Counter()
+
+    @staticmethod
+    def make_key(mode, account, model_name, temperature, stage, inputs, date_bucket=None):
+        """Key identical requests together; inputs are compared case- and whitespace-insensitively.
+
+        ``account`` keeps callers with different API keys apart, so nobody is
+        billed for (or handed the errors of) another user's key.
+        """
+        if date_bucket is None:
+            date_bucket = datetime.now().strftime("%Y-%m-%d")
+        normalized = {name: " ".join(str(value).split()).casefold() for name, value in inputs.items()}
+        raw = json.dumps([mode, account, model_name, temperature, stage, date_bucket, normalized], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _join(self, key, stage):
+        """Return (call, is_leader), registering a new in-flight call if there is none"""
+        with self._lock:
+            call = self._in_flight.get(key)
+            if call is None:
+                call = self._in_flight[key] = InFlightCall()
+                self.leaders[stage] += 1
+                return call, True
+            self.saved[stage] += 1
+            return call, False
+
+    def _finish(self, key, call, value=None, error=None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        with call.condition:
+            call.value = value
+            call.error = error
+            call.finished = True
+            call.condition.notify_all()
+
+    def run(self, key, fn, stage=None):
+        """Return ``(fn(), shared)``, where ``shared`` means another caller's result was reused"""
+        call, leader = self._join(key, stage)
+        if not leader:
+            with call.condition:
+                call.condition.wait_for(lambda: call.finished)
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            value = fn()
+        except Exception as e:
+            self._finish(key, call, error=e)
+            raise
+        self._finish(key, call, value=value)
+        return value, False
+
+    def stream(self, key, start_fn, stage=None):
+        """Return ``(chunks, call, shared)`` for a streamed call.
+
+        The first caller starts a producer thread that drains ``start_fn()``
+        into the shared call; every caller (including the first) reads the
+        chunks from there, so a slow or abandoned reader never holds up the
+        others. The generator's return value ends up in ``call.value``.
+        """
+        call, leader = self._join(key, stage)
+        if leader:
+            threading.Thread(target=self._produce, args=(key, call, start_fn), daemon=True).start()
+        return self._read(call), call, not leader
+
+    def _produce(self, key, call, start_fn):
+        try:
+            chunks = iter(start_fn())
+            while True:
+                try:
+                    chunk = next(chunks)
+                except StopIteration as stop:
+                    self._finish(key, call, value=stop.value)
+                    return
+                with call.condition:
+                    call.chunks.append(chunk)
+                    call.condition.notify_all()
+        except Exception as e:
+            self._finish(key, call, error=e)
+
+    @staticmethod
+    def _read(call):
+        index = 0
+        while True:
+            with call.condition:
+                call.condition.wait_for(lambda: call.finished or index < len(call.chunks))
+                chunks = call.chunks[index:]
+                finished = call.finished
+            index += len(chunks)
+            yield from chunks
+            if finished and index >= len(call.chunks):
+                if call.error is not None:
+                    raise call.error
+                return
+
+    def stats(self):
+        """Calls made and calls saved per stage"""
+        with self._lock:
+            return {
+                stage: {"calls": self.leaders[stage], "saved": self.saved[stage]}
+                for stage in sorted(set(self.leaders) | set(self.saved))
+            }
+
+
+# Which tier of models serves each pipeline stage
+STAGE_TIERS = {
+    "titles": "fast",
+    "keywords": "fast",
+    "json_repair": "fast",
+    "qa_map": "fast",
+    "chat_summary": "fast",
+    "research": "quality",
+    "blog": "quality",
+    "outline": "quality",
+    "section": "quality",
+    "intro": "quality",
+    "conclusion": "quality",
+    "section_rewrite": "quality",
+    "qa": "quality",
+    "qa_reduce": "quality",
+    "chat": "quality",
+}
+
+# Models in order of preference for each tier; later entries are fallbacks
+MODEL_TIERS = {
+    "fast": ["gemma-7b-it", "llama3-70b-8192", "llama-3.3-70b-versatile"],
+    "quality": ["llama3-70b-8192", "llama-3.3-70b-versatile", "gemma-7b-it"],
+}
+
+# Median latency in seconds above which a model is considered too slow for a tier
+TIER_LATENCY_BUDGETS = {"fast": 8.0, "quality": 45.0}
+
+
+class ModelRouter:
+    """Picks the model for each stage and orders fallbacks by recent health.
+
+    Cheap stages go to the fast tier and generation stages to the quality
+    tier. Models that keep failing, are cooling down after a rate limit, or
+    whose median latency for a stage exceeds the tier budget are moved to the
+    back of the list. Models the API reports as decommissioned are dropped.
+    """
+
+    def __init__(self, stage_tiers=None, model_tiers=None, latency_budgets=None, window=20,
+                 max_error_rate=0.5, cooldown_seconds=60.0):
+        self.stage_tiers = stage_tiers or STAGE_TIERS
+        self.model_tiers = model_tiers or MODEL_TIERS
+        self.latency_budgets = latency_budgets or TIER_LATENCY_BUDGETS
+        self.max_error_rate = max_error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._outcomes = defaultdict(lambda: deque(maxlen=window))
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._cooldown_until = {}
+        self._decommissioned = set()
+        self._served = Counter()
+        self._fallbacks = Counter()
+
+    def _is_healthy(self, model_name, stage, tier):
+        outcomes = self._outcomes.get(model_name)
+        if self._cooldown_until.get(model_name, 0) > time.monotonic():
+            return False
+        if outcomes and outcomes.count(False) / len(outcomes) > self.max_error_rate:
+            return False
+        latencies = self._latencies.get((model_name, stage))
+        return not latencies or percentile(list(latencies), 50) <= self.latency_budgets.get(tier, math.inf)
+
+    def candidates(self, stage, preferred=None):
+        """Models to try for a stage, healthiest first.
+
+        ``preferred`` (the model picked in the UI) leads the quality tier.
+        """
+        tier = self.stage_tiers.get(stage, "quality")
+        models = list(self.model_tiers[tier])
+        if preferred is not None and tier == "quality":
+            models = [preferred] + [model_name for model_name in models if model_name != preferred]
+        with self._lock:
+            live = [model_name for model_name in models if model_name not in self._decommissioned]
+            if not live:
+                return models[:1]
+            healthy = [model_name for model_name in live if self._is_healthy(model_name, stage, tier)]
+        return healthy + [model_name for model_name in live if model_name not in healthy]
+
+    def record_success(self, stage, model_name, latency):
+        with self._lock:
+            self._outcomes[model_name].append(True)
+            self._latencies[(model_name, stage)].append(latency)
+            self._served[model_name] += 1
+
+    def record_failure(self, model_name, latency, error):
+        with self._lock:
+            self._outcomes[model_name].append(False)
+            self._fallbacks[model_name] += 1
+            if is_decommissioned_error(error):
+                self._decommissioned.add(model_name)
+            elif getattr(error, "status_code", None) == 429 or "RateLimit" in type(error).__name__:
+                cooldown = retry_after_seconds(error) or self.cooldown_seconds
+                self._cooldown_until[model_name] = time.monotonic() + cooldown
+
+    def stats(self):
+        """Per-model health: calls served, failures, error rate and state"""
+        now = time.monotonic()
+        with self._lock:
+            stats = {}
+            for model_name in sorted(set(self._outcomes) | self._decommissioned):
+                outcomes = self._outcomes[model_name]
+                if model_name in self._decommissioned:
+                    state = "decommissioned"
+                elif self._cooldown_until.get(model_name, 0) > now:
+                    state = "cooling down"
+                else:
+                    state = "ok"
+                stats[model_name] = {
+                    "served": self._served[model_name],
+                    "failures": self._fallbacks[model_name],
+                    "error_rate": outcomes.count(False) / len(outcomes) if outcomes else 0.0,
+                    "state": state,
+                }
+            return stats
+
+
+@dataclass
+class CallRecord:
+    """Measurements for a single BlogGenerator LLM call"""
+    stage: str
+    model: str
+    cache_status: str
+    wall_time: float
+    time_to_first_token: float = None
+    prompt_tokens: int = None
+    completion_tokens: int = None
+    cost: float = 0.0
+    error: str = None
+    timestamp: float = field(default_factory=time.time)
+
+
+class MetricsCallbackHandler:
+    """LangChain callback collecting time-to-first-token and token usage for one call.
+
+    Create instances with ``new()``: it mixes in LangChain's ``BaseCallbackHandler``
+    on first use, so LangChain is not imported until a call is made.
+    """
+
+    _handler_class = None
+
+    @classmethod
+    def new(cls):
+        if cls._handler_class is None:
+            from langchain.callbacks.base import BaseCallbackHandler
+            cls._handler_class = type(cls.__name__, (cls, BaseCallbackHandler), {})
+        return cls._handler_class()
+
+    def __init__(self):
+        self.started = None
+        self.time_to_first_token = None
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.model = None
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.time_to_first_token is None and self.started is not None:
+            self.time_to_first_token = time.perf_counter() - self.started
+
+    def on_llm_end(self, response, **kwargs):
+        llm_output = response.llm_output or {}
+        token_usage = llm_output.get("token_usage") or {}
+        self.prompt_tokens = token_usage.get("prompt_tokens", self.prompt_tokens)
+        self.completion_tokens = token_usage.get("completion_tokens", self.completion_tokens)
+        self.model = llm_output.get("model_name", self.model)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (q between 0 and 100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_records(records):
+    """Aggregate call records into per-stage latency percentiles and token totals"""
+    by_stage = defaultdict(list)
+    for record in records:
+        by_stage[record.stage].append(record)
+    summary = {}
+    for stage, stage_records in by_stage.items():
+        wall_times = [r.wall_time for r in stage_records]
+        first_tokens = [r.time_to_first_token for r in stage_records if r.time_to_first_token is not None]
+        summary[stage] = {
+            "calls": len(stage_records),
+            "cache_hits": sum(1 for r in stage_records if r.cache_status == "hit"),
+            "coalesced": sum(1 for r in stage_records if r.cache_status == "coalesced"),
+            "errors": sum(1 for r in stage_records if r.error),
+            "p50": percentile(wall_times, 50),
+            "p95": percentile(wall_times, 95),
+            "ttft_p50": percentile(first_tokens, 50),
+            "prompt_tokens": sum(r.prompt_tokens or 0 for r in stage_records),
+            "completion_tokens": sum(r.completion_tokens or 0 for r in stage_records),
+            "cost": sum(r.cost for r in stage_records),
+        }
+    return summary
+
+
+class RingBufferSink:
+    """Keeps the most recent call records in memory"""
+
+    def __init__(self, maxlen=500):
+        self._records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+
+class JsonlSink:
+    """Appends every call record as a JSON line to a file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record.__dict__)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class PrometheusSink:
+    """Aggregates call records into Prometheus text exposition format"""
+
+    def __init__(self, window=500):
+        self._calls = Counter()
+        self._tokens = Counter()
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._latency_sums = Counter()
+        self._costs = Counter()
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        with self._lock:
+            self._calls[(record.stage, record.model, record.cache_status, "error" if record.error else "ok")] += 1
+            self._tokens[(record.stage, record.model, "prompt")] += record.prompt_tokens or 0
+            self._tokens[(record.stage, record.model, "completion")] += record.completion_tokens or 0
+            self._latencies[(record.stage, record.model)].append(record.wall_time)
+            self._latency_sums[(record.stage, record.model)] += record.wall_time
+            self._costs[(record.stage, record.model)] += record.cost
+
+    def render(self):
+        """Return the current metrics as Prometheus exposition text"""
+        lines = [
+            "# HELP blogger_llm_calls_total BlogGenerator LLM calls by stage, model, cache status and outcome",
+            "# TYPE blogger_llm_calls_total counter",
+        ]
+        with self._lock:
+            for (stage, model, cache_status, outcome), count in sorted(self._calls.items()):
+                lines.append(
+                    f'blogger_llm_calls_total{{stage="{stage}",model="{model}",'
+                    f'cache="{cache_status}",outcome="{outcome}"}} {count}'
+                )
+            lines += [
+                "# HELP blogger_llm_tokens_total Tokens used by stage, model and kind",
+                "# TYPE blogger_llm_tokens_total counter",
+            ]
+            for (stage, model, kind), count in sorted(self._tokens.items()):
+                lines.append(f'blogger_llm_tokens_total{{stage="{stage}",model="{model}",kind="{kind}"}} {count}')
+            lines += [
+                "# HELP blogger_llm_cost_usd_total Estimated spend by stage and model",
+                "# TYPE blogger_llm_cost_usd_total counter",
+            ]
+            for (stage, model), cost in sorted(self._costs.items()):
+                lines.append(f'blogger_llm_cost_usd_total{{stage="{stage}",model="{model}"}} {cost:.6f}')
+            lines += [
+                "# HELP blogger_llm_latency_seconds Wall time of LLM calls",
+                "# TYPE blogger_llm_latency_seconds summary",
+            ]
+            for (stage, model), latencies in sorted(self._latencies.items()):
+                labels = f'stage="{stage}",model="{model}"'
+                for q in (50, 95):
+                    lines.append(
+                        f'blogger_llm_latency_seconds{{{labels},quantile="{q / 100}"}} '
+                        f'{percentile(list(latencies), q):.4f}'
+                    )
+                count = sum(n for key, n in self._calls.items() if key[:2] == (stage, model))
+                lines.append(f"blogger_llm_latency_seconds_sum{{{labels}}} {self._latency_sums[(stage, model)]:.4f}")
+                lines.append(f"blogger_llm_latency_seconds_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port):
+        """Expose render() at http://0.0.0.0:<port>/metrics from a daemon thread"""
+        sink = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class Instrumentation:
+    """Fans call records out to any number of sinks"""
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+
+    def emit(self, record):
+        for sink in self.sinks:
+            sink.emit(record)
+
+    def records(self):
+        """Records held by the first in-memory sink (empty if there is none)"""
+        for sink in self.sinks:
+            if isinstance(sink, RingBufferSink):
+                return sink.records()
+        return []
+
+    def prometheus(self):
+        """The first Prometheus sink, if any"""
+        for sink in self.sinks:
+            if isinstance(sink, PrometheusSink):
+                return sink
+        return None
+
+
+class TokenStream:
+    """Iterable over completion tokens that records timings as it is consumed.
+
+    Once fully iterated, ``text`` holds the complete completion and
+    ``time_to_first_token`` / ``total_time`` hold the timings in seconds.
+    ``on_complete(stream)`` and ``on_error(stream, error)`` are called when
+    iteration finishes or fails.
+    """
+
+    def __init__(self, stage, chunks, on_complete=None, on_error=None):
+        self.stage = stage
+        self.text = ""
+        self.time_to_first_token = None
+        self.total_time = None
+        self._chunks = chunks
+        self._on_complete = on_complete
+        self._on_error = on_error
+
+    def __iter__(self):
+        start = time.perf_counter()
+        parts = []
+        try:
+            for chunk in self._chunks:
+                if not chunk:
+                    continue
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time.perf_counter() - start
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            self.total_time = time.perf_counter() - start
+            if self._on_error is not None:
+                self._on_error(self, e)
+            raise
+        self.total_time = time.perf_counter() - start
+        self.text = "".join(parts)
+        if self._on_complete is not None:
+            self._on_complete(self)
+
+    def timing_summary(self):
+        """Human readable timing line for display under the generated content"""
+        if self.total_time is None:
+            return ""
+        return (
+            f"{self.stage}: first token after {self.time_to_first_token or 0:.2f}s, "
+            f"complete in {self.total_time:.2f}s"
+        )
+
+
+class LazyPrompt:
+    """Prompt template text whose LangChain ``PromptTemplate`` is built on first use.
+
+    Formatting is plain ``str.format`` (what an f-string ``PromptTemplate`` does),
+    so cache lookups and token estimates never need LangChain to be imported.
+    """
+
+    def __init__(self, input_variables, template):
+        self.input_variables = input_variables
+        self.template = template
+        self._compiled = None
+
+    def format(self, **kwargs):
+        return self.template.format(**{name: kwargs[name] for name in self.input_variables})
+
+    def compile(self):
+        """Return the shared LangChain PromptTemplate for this prompt"""
+        if self._compiled is None:
+            from langchain.prompts import PromptTemplate
+            self._compiled = PromptTemplate(input_variables=self.input_variables, template=self.template)
+        return self._compiled
+
+
+class BlogGenerator:
+    # Prompt templates are defined once at class level and shared by every instance
+    RESEARCH_PROMPT = LazyPrompt(
+        input_variables=["topic", "current_date"],
+        template="""
+        As a professional research assistant, gather comprehensive and CURRENT information about: {topic}
+
+        Today's date is {current_date}. Prioritize information from the last 6 months.
+
+        Provide:
+        1. Key facts and statistics (with sources cited as clickable links)
+        2. Current trends and developments (with clickable sources where applicable)
+        3. Common misconceptions
+        4. Expert opinions or quotes (with attribution)
+        5. Related subtopics worth exploring
+
+        FOR CURRENT INFORMATION:
+        - Clearly indicate when information was published (month and year)
+        - For each fact/statistic, include the publication date
+        - If data is older than 6 months, flag it as potentially outdated
+        - Format all sources as clickable markdown links: [Source Name](URL)
+
+        Example format:
+        - "According to recent data (March 2024), 72% of users prefer mobile apps [Source: Pew Research](https://www.pewresearch.org)"
+
+        Format your response with clear headings for each section.
+        Include markdown formatting for better readability.
+        """
+    )
+
+    TITLES_PROMPT = LazyPrompt(
+        input_variables=["topic", "schema"],
+        template="""
+        You're an expert content strategist. Suggest 5 engaging blog title options about {topic}.
+        The titles should be:
+        - SEO-friendly
+        - Appealing to readers
+        - Reflective of current trends (mention if relevant)
+
+        Respond with a single JSON object matching this JSON schema and nothing else:
+        {schema}
+
+        Give each title as plain text, without numbering or quotes around it.
+        Example: {{"titles": ["Title One [Trending in 2025]", "Title Two", "Title Three"]}}
+        """
+    )
+
+    KEYWORDS_PROMPT = LazyPrompt(
+        input_variables=["title", "current_year", "schema"],
+        template="""
+        Suggest 10-15 relevant keywords and important concepts that should be included 
+        in a blog post titled: {title}
+
+        Include:
+        - Current year ({current_year}) where relevant
+        - Trending terms related to the topic
+        - Long-tail keywords
+
+        Respond with a single JSON object matching this JSON schema and nothing else:
+        {schema}
+        """
+    )
+
+    JSON_REPAIR_PROMPT = LazyPrompt(
+        input_variables=["schema", "error", "output"],
+        template="""
+        The text below was meant to be a single JSON object matching this JSON schema:
+        {schema}
+
+        It could not be used: {error}
+
+        Text:
+        {output}
+
+        Return only the corrected JSON object with the same content, without commentary or code fences.
+        """
+    )
+
+    BLOG_PROMPT = LazyPrompt(
+        input_variables=["title", "keywords", "word_limit", "current_date"],
+        template="""
+        Write a comprehensive, SEO-optimized blog post with the following details:
+
+        Title: {title}
+        Keywords to include: {keywords}
+        Word limit: Approximately {word_limit} words
+        Current date: {current_date}
+
+        Requirements:
+        - Target approximately {word_limit} words
+        - Use markdown formatting
+        - Include headings (H2, H3) for proper structure
+        - Write in a professional yet engaging tone
+        - Include relevant examples where appropriate
+        - End with a conclusion and call-to-action
+        - Format all sources as clickable markdown links: [Source Name](URL)
+
+        STRICT CURRENT INFORMATION REQUIREMENTS:
+        - Clearly state the publication date for all facts/statistics
+        - If using older data, explain why it's still relevant
+        - Include at least 3 recent (last 6 months) references with clickable links
+        - For time-sensitive topics, note when readers should check for updates
+
+        Structure:
+        # [Title]
+        *Last updated: [Month Year]*
+
+        ## Introduction
+        [Engaging introduction paragraph mentioning current relevance]
+
+        ## [Main Section 1]
+        [Detailed content with clickable sources and dates where needed]
+
+        ## [Main Section 2]
+        [Detailed content with clickable sources and dates where needed]
+
+        ## Conclusion
+        [Summary and call-to-action with current relevance]
+
+        ## References
+        [List all clickable links used in the article]
+        """
+    )
+
+    OUTLINE_PROMPT = LazyPrompt(
+        input_variables=["title", "keywords", "word_limit", "section_count", "research", "current_date"],
+        template="""
+        Plan a long-form, SEO-optimized blog post of approximately {word_limit} words.
+
+        Title: {title}
+        Keywords to include: {keywords}
+        Current date: {current_date}
+
+        Research notes:
+        {research}
+
+        Write an outline of exactly {section_count} main sections. Do not include the
+        introduction, conclusion or references; those are written separately.
+        Each section must cover distinct ground so no two sections repeat each other.
+
+        Format every section as an H2 heading followed by 2-4 bullet points of what it covers:
+
+        ## [Section heading]
+        - [Point to cover]
+        - [Point to cover]
+        """
+    )
+
+    SECTION_PROMPT = LazyPrompt(
+        input_variables=["title", "keywords", "outline", "heading", "notes", "research", "section_words",
+                         "current_date"],
+        template="""
+        You are writing one section of a long-form blog post titled "{title}".
+        Keywords for the whole post: {keywords}
+        Current date: {current_date}
+
+        Full outline (other sections are written separately, do not repeat their content):
+        {outline}
+
+        Research notes:
+        {research}
+
+        Write ONLY the section "{heading}" in approximately {section_words} words, covering:
+        {notes}
+
+        Requirements:
+        - Start with the line: ## {heading}
+        - Use H3 subheadings where they help, never H1 or other H2 headings
+        - No introduction or conclusion for the whole post
+        - Clearly state the publication date for facts and statistics
+        - Format all sources as clickable markdown links: [Source Name](URL)
+        """
+    )
+
+    INTRO_PROMPT = LazyPrompt(
+        input_variables=["title", "keywords", "outline", "current_date"],
+        template="""
+        Write the introduction of a long-form blog post titled "{title}" ({current_date}).
+        Keywords: {keywords}
+
+        The post covers these sections:
+        {outline}
+
+        Write 120-180 words that explain why the topic matters right now and preview
+        what the reader will learn. Do not include a heading.
+        """
+    )
+
+    CONCLUSION_PROMPT = LazyPrompt(
+        input_variables=["title", "keywords", "outline", "current_date"],
+        template="""
+        Write the conclusion of a long-form blog post titled "{title}" ({current_date}).
+        Keywords: {keywords}
+
+        The post covered these sections:
+        {outline}
+
+        Write 120-180 words that summarize the key takeaways, note when readers should
+        check for updates, and end with a call-to-action. Do not include a heading.
+        """
+    )
+
+    SECTION_REWRITE_PROMPT = LazyPrompt(
+        input_variables=["title", "keywords", "outline", "previous", "section", "following", "instructions",
+                         "current_date"],
+        template="""
+        You are revising one section of a blog post titled "{title}".
+        Keywords for the whole post: {keywords}
+        Current date: {current_date}
+
+        Sections of the post:
+        {outline}
+
+        End of the previous section:
+        {previous}
+
+        Section to rewrite:
+        {section}
+
+        Start of the next section:
+        {following}
+
+        Rewrite ONLY this section. {instructions}
+
+        Requirements:
+        - Keep the same heading line and roughly the same length
+        - Flow naturally from the previous section into the next one without repeating them
+        - Clearly state the publication date for facts and statistics
+        - Format all sources as clickable markdown links: [Source Name](URL)
+        - Reply with the rewritten section only
+        """
+    )
+
+    QA_PROMPT = LazyPrompt(
+        input_variables=["blog_content", "current_date"],
+        template="""
+        Today's date is {current_date}. Based on the following blog content, generate a comprehensive Q&A section:
+        
+        {blog_content}
+        
+        Create 5-8 thoughtful questions a reader might have after reading this content,
+        and provide detailed answers using information from the blog.
+        
+        For each answer:
+        - Note how current the information is
+        - If data is older than 6 months, suggest checking for updates
+        - Include reference dates for all facts
+        - Format all sources as clickable markdown links: [Source Name](URL)
+        
+        Format as:
+        
+        ## Frequently Asked Questions (Updated {current_date})
+        
+        ### [Question 1]
+        [Answer 1 with date references and clickable links]
+        
+        ### [Question 2]
+        [Answer 2 with date references and clickable links]
+        """
+    )
+
+    QA_MAP_PROMPT = LazyPrompt(
+        input_variables=["section", "current_date"],
+        template="""
+        Today's date is {current_date}. The following is one section of a longer blog post:
+
+        {section}
+
+        List 2-3 questions a reader might have about THIS section, each followed by a
+        concise answer that uses only information from the section. Keep any dates and
+        clickable markdown links [Source Name](URL) that support the answer.
+
+        Format as:
+
+        Q: [Question]
+        A: [Answer]
+        """
+    )
+
+    QA_REDUCE_PROMPT = LazyPrompt(
+        input_variables=["candidates", "current_date"],
+        template="""
+        Today's date is {current_date}. Below are candidate questions and answers extracted
+        from each section of a blog post:
+
+        {candidates}
+
+        Merge them into a comprehensive Q&A section of 5-8 questions: drop duplicates and
+        near-duplicates, keep the most useful questions and combine overlapping answers.
+
+        For each answer:
+        - Note how current the information is
+        - If data is older than 6 months, suggest checking for updates
+        - Include reference dates for all facts
+        - Format all sources as clickable markdown links: [Source Name](URL)
+
+        Format as:
+
+        ## Frequently Asked Questions (Updated {current_date})
+
+        ### [Question 1]
+        [Answer 1 with date references and clickable links]
+
+        ### [Question 2]
+        [Answer 2 with date references and clickable links]
+        """
+    )
+
+    CHAT_PROMPT = LazyPrompt(
+        input_variables=["current_date", "human_input", "history", "blog_context"],
+        template="""
+        **Current Date**: {current_date}
+
+        {blog_context}
+
+        **Conversation So Far**:
+        {history}
+        
+        **User Message**: {human_input}
+
+        You are a helpful AI assistant. Provide general information and answer questions.
+        For current topics, always mention the date when providing facts or statistics.
+
+        **Response**:
+        """
+    )
+
+    CHAT_SUMMARY_PROMPT = LazyPrompt(
+        input_variables=["summary", "new_lines"],
+        template="""
+        Progressively summarize the conversation between a user and an AI assistant,
+        adding the new lines to the existing summary. Keep names, facts, decisions and
+        open questions; drop pleasantries. Reply with the updated summary only.
+
+        Existing summary:
+        {summary}
+
+        New lines:
+        {new_lines}
+
+        Updated summary:
+        """
+    )
+
+    STAGE_PROMPTS = {
+        "research": RESEARCH_PROMPT,
+        "titles": TITLES_PROMPT,
+        "keywords": KEYWORDS_PROMPT,
+        "json_repair": JSON_REPAIR_PROMPT,
+        "blog": BLOG_PROMPT,
+        "outline": OUTLINE_PROMPT,
+        "section": SECTION_PROMPT,
+        "intro": INTRO_PROMPT,
+        "conclusion": CONCLUSION_PROMPT,
+        "section_rewrite": SECTION_REWRITE_PROMPT,
+        "qa": QA_PROMPT,
+        "qa_map": QA_MAP_PROMPT,
+        "qa_reduce": QA_REDUCE_PROMPT,
+        "chat": CHAT_PROMPT,
+        "chat_summary": CHAT_SUMMARY_PROMPT,
+    }
+
+    # Rough completion sizes used to reserve token budget before a call
+    EXPECTED_COMPLETION_TOKENS = {
+        "research": 1200,
+        "titles": 100,
+        "keywords": 150,
+        "json_repair": 200,
+        "blog": 1500,
+        "outline": 400,
+        "section": 900,
+        "intro": 300,
+        "conclusion": 300,
+        "section_rewrite": 900,
+        "qa": 1000,
+        "qa_map": 300,
+        "qa_reduce": 1000,
+        "chat": 500,
+        "chat_summary": 300,
+    }
+
+    # Conversational replies depend on the whole exchange, so they are never cached
+    UNCACHED_STAGES = {"chat"}
+
+    # Free-text parsers for structured stages whose JSON could not be repaired
+    STRUCTURED_FALLBACK_PARSERS = {"titles": parse_titles, "keywords": parse_keywords}
+
+    def __init__(self, groq_api_key, model_name="llama3-70b-8192", temperature=0.7, cache=None, limiter=None,
+                 metrics=None, router=None, coalescer=None):
+        self.model_name = model_name
+        self.temperature = temperature
+        self.cache = cache
+        self.limiter = limiter
+        self.metrics = metrics
+        self.router = router
+        self.coalescer = coalescer
+        self.account = hashlib.sha256(groq_api_key.encode("utf-8")).hexdigest()[:16]
+        self._groq_api_key = groq_api_key
+        self._llms = {}
+        self._chains = {}
+        self._local = threading.local()
+
+    @property
+    def llm(self):
+        """ChatGroq client for the default model"""
+        return self._llm(self.model_name)
+
+    def _llm(self, model_name):
+        """Return the ChatGroq client for a model, creating it on first use.
+
+        langchain_groq is imported here rather than at module level so the app
+        can paint before the LangChain stack has loaded.
+        """
+        llm = self._llms.get(model_name)
+        if llm is None:
+            from langchain_groq import ChatGroq
+            llm = self._llms.setdefault(model_name, ChatGroq(
+                temperature=self.temperature,
+                model_name=model_name,
+                groq_api_key=self._groq_api_key,
+                # Retries are handled by the shared RateLimiter when one is configured
+                max_retries=0 if self.limiter is not None else 2
+            ))
+        return llm
+
+    def _token_budget(self, stage, prompt_text):
+        """Tokens to reserve from the rate limiter for a call"""
+        return estimate_tokens(prompt_text) + self.EXPECTED_COMPLETION_TOKENS.get(stage, 500)
+
+    def _chain(self, stage, model_name=None):
+        """Return the LLMChain for a stage and model, building it on first use"""
+        model_name = model_name or self.model_name
+        chain = self._chains.get((stage, model_name))
+        if chain is None:
+            from langchain.chains import LLMChain
+            chain = LLMChain(llm=self._llm(model_name), prompt=self.STAGE_PROMPTS[stage].compile())
+            self._chains[(stage, model_name)] = chain
+        return chain
+
+    def _candidates(self, stage):
+        """Models to try for a stage, best first"""
+        if self.router is None:
+            return [self.model_name]
+        return self.router.candidates(stage, preferred=self.model_name)
+
+    def last_served_model(self):
+        """Model that produced the most recent completion on the calling thread"""
+        return getattr(self._local, "served_by", None)
+
+    def _retries_before_fallback(self, attempt, models):
+        """Retry once before moving on while fallback models remain, otherwise use the limiter default"""
+        return 1 if attempt < len(models) - 1 else None
+
+    def _should_fail_over(self, model_name, elapsed, error):
+        """Report a failed call to the router and decide whether another model may serve it"""
+        if self.router is None:
+            return False
+        self.router.record_failure(model_name, elapsed, error)
+        return is_retryable_error(error) or is_decommissioned_error(error)
+
+    def _cache_lookup(self, stage, prompt_text, use_cache, model_name):
+        """Return (key, cache status, cached value) for a call"""
+        if self.cache is None or stage in self.UNCACHED_STAGES:
+            return None, "off", None
+        key = self.cache.make_key(model_name, self.temperature, prompt_text)
+        if not use_cache:
+            return key, "bypass", None
+        cached = self.cache.get(key)
+        return key, "hit" if cached is not None else "miss", cached
+
+    def _store(self, stage, model_name, prompt_text, result):
+        """Cache a fresh completion under the model that produced it"""
+        if self.cache is not None and stage not in self.UNCACHED_STAGES:
+            self.cache.set(self.cache.make_key(model_name, self.temperature, prompt_text), result)
+
+    def _finish_call(self, stage, model_name, cache_status, wall_time, handler=None, prompt_text="",
+                     result=None, error=None, time_to_first_token=None, reserved=None):
+        """Settle the rate limiter and emit a CallRecord once a call is over"""
+        record = CallRecord(stage=stage, model=model_name, cache_status=cache_status, wall_time=wall_time)
+        if handler is not None:
+            record.time_to_first_token = time_to_first_token or handler.time_to_first_token
+            record.prompt_tokens = handler.prompt_tokens
+            record.completion_tokens = handler.completion_tokens
+            if result is not None and record.completion_tokens is None:
+                # Streamed completions carry no usage block, so fall back to estimates
+                record.prompt_tokens = estimate_tokens(prompt_text)
+                record.completion_tokens = estimate_tokens(result)
+        if error is not None:
+            record.error = f"{type(error).__name__}: {error}"
+        prompt_price, completion_price = MODEL_PRICING.get(record.model, (0.0, 0.0))
+        record.cost = (
+            (record.prompt_tokens or 0) * prompt_price + (record.completion_tokens or 0) * completion_price
+        ) / 1_000_000
+
+        if self.limiter is not None and reserved is not None and result is not None:
+            used = (record.prompt_tokens or 0) + (record.completion_tokens or 0)
+            self.limiter.settle(model_name, reserved, used, account=self.account)
+        if self.metrics is not None:
+            self.metrics.emit(record)
+
+    def _run(self, stage, use_cache=True, **inputs):
+        """Run a stage prompt through the LLM, serving repeated requests from the cache.
+
+        Passing ``use_cache=False`` skips the lookup but still stores the fresh
+        completion, so a regenerate refreshes the cached entry. With a router,
+        the stage's models are tried in order until one succeeds. With a
+        coalescer, identical requests already in flight are joined instead of
+        repeated. Every call is reported to the configured instrumentation.
+        """
+        start = time.perf_counter()
+        prompt_text = self.STAGE_PROMPTS[stage].format(**inputs)
+        models = self._candidates(stage)
+        key, cache_status, cached = self._cache_lookup(stage, prompt_text, use_cache, models[0])
+        if cached is not None:
+            self._local.served_by = models[0]
+            self._finish_call(stage, models[0], cache_status, time.perf_counter() - start)
+            return cached
+
+        if self.coalescer is None or stage in self.UNCACHED_STAGES:
+            return self._call_models(stage, models, prompt_text, inputs, key, cache_status, start)
+        flight_key = self.coalescer.make_key("run", self.account, models[0], self.temperature, stage, inputs)
+        (result, served_by), shared = self.coalescer.run(
+            flight_key,
+            lambda: (
+                self._call_models(stage, models, prompt_text, inputs, key, cache_status, start),
+                self.last_served_model()
+            ),
+            stage=stage
+        )
+        if shared:
+            self._local.served_by = served_by
+            self._finish_call(stage, served_by, "coalesced", time.perf_counter() - start)
+        return result
+
+    def _call_models(self, stage, models, prompt_text, inputs, key, cache_status, start):
+        """Call the LLM for an uncached request, failing over across ``models``"""
+        reserved = self._token_budget(stage, prompt_text)
+        for attempt, model_name in enumerate(models):
+            chain = self._chain(stage, model_name)
+            handler = MetricsCallbackHandler.new()
+            call_start = time.perf_counter()
+            try:
+                if self.limiter is not None:
+                    result = self.limiter.call(
+                        model_name,
+                        reserved,
+                        lambda: chain.run(callbacks=[handler], **inputs),
+                        account=self.account,
+                        max_retries=self._retries_before_fallback(attempt, models)
+                    )
+                else:
+                    result = chain.run(callbacks=[handler], **inputs)
+            except Exception as e:
+                elapsed = time.perf_counter() - call_start
+                self._finish_call(stage, model_name, cache_status, elapsed, handler, error=e)
+                fail_over = self._should_fail_over(model_name, elapsed, e)
+                if attempt == len(models) - 1 or not fail_over:
+                    raise
+                continue
+
+            if self.router is not None:
+                self.router.record_success(stage, model_name, time.perf_counter() - call_start)
+            self._local.served_by = model_name
+            self._finish_call(
+                stage, model_name, cache_status, time.perf_counter() - start, handler,
+                prompt_text=prompt_text, result=result, reserved=reserved
+            )
+            if key is not None:
+                self._store(stage, model_name, prompt_text, result)
+            return result
+
+    def _stream(self, stage, use_cache=True, **inputs):
+        """Return a TokenStream over the completion, honouring the cache like _run.
 
-class BlogGenerator:
-    def __init__(self, groq_api_key, model_name="llama3-70b-8192"):
-        
-        self.llm = ChatGroq(
-            temperature=0.7,
-            model_name=model_name,
-            groq_api_key=groq_api_key
-        )
-        
-    def research_content(self, topic):
-        """Research content and gather relevant information about the topic"""
-        current_date = datetime.now().strftime("%Y-%m-%d")
+        Failing over to the next routed model only happens before the first
+        token arrives, so the consumer never sees output from two models.
+        With a coalescer, readers of an identical stream already in flight
+        receive its tokens instead of starting another call.
+        """
+        prompt_text = self.STAGE_PROMPTS[stage].format(**inputs)
+        models = self._candidates(stage)
+        key, cache_status, cached = self._cache_lookup(stage, prompt_text, use_cache, models[0])
+        if cached is not None:
+            self._local.served_by = models[0]
+            self._finish_call(stage, models[0], cache_status, 0.0)
+            return TokenStream(stage, iter([cached]))
 
-        prompt = PromptTemplate(
-            input_variables=["topic", "current_date"],
-            template="""
-            As a professional research assistant, gather comprehensive and CURRENT information about: {topic}
+        if self.coalescer is None or stage in self.UNCACHED_STAGES:
+            return self._model_stream(stage, models, prompt_text, key, cache_status)
 
-            Today's date is {current_date}. Prioritize information from the last 6 months.
+        def produce():
+            yield from self._model_stream(stage, models, prompt_text, key, cache_status)
+            # Runs on the producer thread, right after the stream's on_complete
+            return self.last_served_model()
 
-            Provide:
-            1. Key facts and statistics (with sources cited as clickable links)
-            2. Current trends and developments (with clickable sources where applicable)
-            3. Common misconceptions
-            4. Expert opinions or quotes (with attribution)
-            5. Related subtopics worth exploring
+        flight_key = self.coalescer.make_key("stream", self.account, models[0], self.temperature, stage, inputs)
+        chunks, call, shared = self.coalescer.stream(flight_key, produce, stage=stage)
 
-            FOR CURRENT INFORMATION:
-            - Clearly indicate when information was published (month and year)
-            - For each fact/statistic, include the publication date
-            - If data is older than 6 months, flag it as potentially outdated
-            - Format all sources as clickable markdown links: [Source Name](URL)
+        def on_complete(stream):
+            self._local.served_by = call.value
+            if shared:
+                self._finish_call(stage, call.value or models[0], "coalesced", stream.total_time)
 
-            Example format:
-            - "According to recent data (March 2024), 72% of users prefer mobile apps [Source: Pew Research](https://www.pewresearch.org)"
+        return TokenStream(stage, chunks, on_complete=on_complete)
 
-            Format your response with clear headings for each section.
-            Include markdown formatting for better readability.
-            """
-        )
-        
-        chain = LLMChain(llm=self.llm, prompt=prompt)
-        result = chain.run(topic=topic, current_date=current_date)
+    def _model_stream(self, stage, models, prompt_text, key, cache_status):
+        """TokenStream over an uncached completion, failing over across ``models`` before the first token"""
+        reserved = self._token_budget(stage, prompt_text)
+        # Model and callback handler of the attempt that is (or was last) streaming
+        current = {}
+
+        def chunks():
+            for attempt, model_name in enumerate(models):
+                handler = MetricsCallbackHandler.new()
+                config = {"callbacks": [handler]}
+                current.update(model=model_name, handler=handler, started=time.perf_counter())
+                start_stream = lambda: self._llm(model_name).stream(prompt_text, config=config)
+                if self.limiter is not None:
+                    messages = self.limiter.stream(
+                        model_name, reserved, start_stream, account=self.account,
+                        max_retries=self._retries_before_fallback(attempt, models)
+                    )
+                else:
+                    messages = start_stream()
+                yielded = False
+                try:
+                    for message in messages:
+                        yielded = True
+                        yield message.content
+                    return
+                except Exception as e:
+                    elapsed = time.perf_counter() - current["started"]
+                    fail_over = self._should_fail_over(model_name, elapsed, e)
+                    if yielded or attempt == len(models) - 1 or not fail_over:
+                        raise
+                    self._finish_call(stage, model_name, cache_status, elapsed, handler, error=e)
+
+        def on_complete(stream):
+            model_name = current["model"]
+            if self.router is not None:
+                self.router.record_success(stage, model_name, time.perf_counter() - current["started"])
+            self._local.served_by = model_name
+            self._finish_call(
+                stage, model_name, cache_status, stream.total_time, current["handler"],
+                prompt_text=prompt_text, result=stream.text,
+                time_to_first_token=stream.time_to_first_token, reserved=reserved
+            )
+            if key is not None:
+                self._store(stage, model_name, prompt_text, stream.text)
+
+        def on_error(stream, error):
+            self._finish_call(
+                stage, current.get("model", models[0]), cache_status, stream.total_time,
+                current.get("handler"), error=error
+            )
+
+        return TokenStream(stage, chunks(), on_complete=on_complete, on_error=on_error)
+
+    def research_content(self, topic, use_cache=True):
+        """Research content and gather relevant information about the topic"""
+        current_date = datetime.now().strftime("%Y-%m-%d")
+        result = self._run("research", use_cache=use_cache, topic=topic, current_date=current_date)
         return result
+
+    def stream_research_content(self, topic, use_cache=True):
+        """Stream research tokens as they are generated"""
+        current_date = datetime.now().strftime("%Y-%m-%d")
+        return self._stream("research", use_cache=use_cache, topic=topic, current_date=current_date)
     
-    def generate_titles(self, topic):
-        """Generate blog title suggestions based on topic"""
-        prompt = PromptTemplate(
-            input_variables=["topic"],
-            template="""
-            You're an expert content strategist. Suggest 5 engaging blog title options about {topic}.
-            The titles should be:
-            - SEO-friendly
-            - Appealing to readers
-            - Reflective of current trends (mention if relevant)
-            
-            Format your response as a numbered list with no additional commentary.
-            Do not add the response line of here are five titles.
-
-            Example format:
-            1. Title One [Trending in 2025]
-            2. Title Two
-            3. Title Three
-            """
-        )
-        
-        chain = LLMChain(llm=self.llm, prompt=prompt)
-        result = chain.run(topic=topic)
-        return result
+    def _run_structured(self, stage, use_cache=True, max_repairs=1, **inputs):
+        """Run a stage that answers in JSON and return its validated list.
+
+        An answer that fails validation is sent back with the error through the
+        ``json_repair`` prompt (at most ``max_repairs`` times) rather than being
+        regenerated. If that still does not validate, the items are recovered
+        leniently from the JSON; only an answer with no JSON object at all is
+        parsed as free text.
+        """
+        schema = STRUCTURED_OUTPUT_SCHEMAS[stage]
+        schema_text = json.dumps(schema)
+        answer = text = self._run(stage, use_cache=use_cache, schema=schema_text, **inputs)
+        answer_error = None
+        for attempt in range(max_repairs + 1):
+            try:
+                return parse_structured_list(text, schema)
+            except ValueError as e:
+                error = str(e)
+                answer_error = answer_error or error
+            if attempt < max_repairs:
+                text = self._run("json_repair", use_cache=use_cache, schema=schema_text, error=error, output=text)
+        for candidate in (text, answer):
+            items = recover_structured_list(candidate, schema)
+            if items:
+                return items
+        if "{" not in answer:
+            items = self.STRUCTURED_FALLBACK_PARSERS[stage](answer)
+            if items:
+                return items
+        raise ValueError(f"The model did not return usable {stage}: {answer_error}")
+
+    def generate_titles(self, topic, use_cache=True):
+        """Generate blog title suggestions based on topic, as a list of titles"""
+        return self._run_structured("titles", use_cache=use_cache, topic=topic)
     
-    def generate_keywords(self, title):
-        """Suggest relevant keywords for the blog"""
+    def generate_keywords(self, title, use_cache=True):
+        """Suggest relevant keywords for the blog, as a list of keywords"""
         current_year = datetime.now().year
-        
-        prompt = PromptTemplate(
-            input_variables=["title", "current_year"],
-            template="""
-            Suggest 10-15 relevant keywords and important concepts that should be included 
-            in a blog post titled: {title}
-
-            Do not add any additional commentary like Here is the list of keywords and concepts:
-
-            Include:
-            - Current year ({current_year}) where relevant
-            - Trending terms related to the topic
-            - Long-tail keywords
-            
-            Format as a comma-separated list with no additional commentary.
-            """
-        )
-        
-        chain = LLMChain(llm=self.llm, prompt=prompt)
-        result = chain.run(title=title, current_year=current_year)
-        return result
-    
-    def generate_blog(self, title, keywords, word_limit):
+        return self._run_structured("keywords", use_cache=use_cache, title=title, current_year=current_year)
+
+    def generate_blog(self, title, keywords, word_limit, use_cache=True):
         """Generate full blog content based on selected title and keywords"""
         current_date = datetime.now().strftime("%B %Y")
-
-        prompt = PromptTemplate(
-            input_variables=["title", "keywords", "word_limit", "current_date"],
-            template="""
-            Write a comprehensive, SEO-optimized blog post with the following details:
-
-            Title: {title}
-            Keywords to include: {keywords}
-            Word limit: Approximately {word_limit} words
-            Current date: {current_date}
-
-            Requirements:
-            - Target approximately {word_limit} words
-            - Use markdown formatting
-            - Include headings (H2, H3) for proper structure
-            - Write in a professional yet engaging tone
-            - Include relevant examples where appropriate
-            - End with a conclusion and call-to-action
-            - Format all sources as clickable markdown links: [Source Name](URL)
-
-            STRICT CURRENT INFORMATION REQUIREMENTS:
-            - Clearly state the publication date for all facts/statistics
-            - If using older data, explain why it's still relevant
-            - Include at least 3 recent (last 6 months) references with clickable links
-            - For time-sensitive topics, note when readers should check for updates
-
-            Structure:
-            # [Title]
-            *Last updated: [Month Year]*
-
-            ## Introduction
-            [Engaging introduction paragraph mentioning current relevance]
-
-            ## [Main Section 1]
-            [Detailed content with clickable sources and dates where needed]
-
-            ## [Main Section 2]
-            [Detailed content with clickable sources and dates where needed]
-
-            ## Conclusion
-            [Summary and call-to-action with current relevance]
-
-            ## References
-            [List all clickable links used in the article]
-            """
-        )
-        
-        chain = LLMChain(llm=self.llm, prompt=prompt)
-        result = chain.run(title=title, keywords=keywords, word_limit=word_limit, current_date=current_date)
+        result = self._run("blog", use_cache=use_cache, title=title, keywords=keywords,
+                           word_limit=word_limit, current_date=current_date)
         return result
-    
-    def generate_qa(self, blog_content):
-        """Generate Q&A section based on blog content"""
+
+    def stream_blog(self, title, keywords, word_limit, use_cache=True):
+        """Stream blog tokens as they are generated"""
         current_date = datetime.now().strftime("%B %Y")
-        
-        prompt = PromptTemplate(
-            input_variables=["blog_content", "current_date"],
-            template="""
-            Today's date is {current_date}. Based on the following blog content, generate a comprehensive Q&A section:
-            
-            {blog_content}
-            
-            Create 5-8 thoughtful questions a reader might have after reading this content,
-            and provide detailed answers using information from the blog.
-            
-            For each answer:
-            - Note how current the information is
-            - If data is older than 6 months, suggest checking for updates
-            - Include reference dates for all facts
-            - Format all sources as clickable markdown links: [Source Name](URL)
-            
-            Format as:
-            
-            ## Frequently Asked Questions (Updated {current_date})
-            
-            ### [Question 1]
-            [Answer 1 with date references and clickable links]
-            
-            ### [Question 2]
-            [Answer 2 with date references and clickable links]
-            """
+        return self._stream("blog", use_cache=use_cache, title=title, keywords=keywords,
+                            word_limit=word_limit, current_date=current_date)
+
+    def generate_long_blog(self, title, keywords, word_limit, research="", use_cache=True, max_workers=4,
+                           on_progress=None):
+        """Generate a long-form post from an outline, writing its sections in parallel.
+
+        An outline is generated first; every H2 section, the introduction and
+        the conclusion are then written concurrently with the same shared
+        context (title, keywords, outline and a research excerpt), so wall time
+        is close to the slowest section rather than the sum. Links used in the
+        sections are collected into a deduplicated references list.
+        ``on_progress(done, total)`` is called from the calling thread as parts
+        finish; an exception raised by it stops the remaining parts. Afterwards
+        ``last_served_model()`` names the models that wrote the sections.
+        """
+        current_date = datetime.now().strftime("%B %Y")
+        low, high = LONG_FORM_SECTION_BOUNDS
+        section_count = min(high, max(low, round(word_limit / LONG_FORM_WORDS_PER_SECTION)))
+        research = research[:LONG_FORM_RESEARCH_TOKENS * 4] or "(none provided)"
+
+        outline_text = self._run(
+            "outline", use_cache=use_cache, title=title, keywords=keywords, word_limit=word_limit,
+            section_count=section_count, research=research, current_date=current_date
         )
-        
-        chain = LLMChain(llm=self.llm, prompt=prompt)
-        result = chain.run(blog_content=blog_content, current_date=current_date)
+        outline = parse_outline(outline_text)
+        if not outline:
+            raise ValueError("The model did not return a usable outline")
+        headings = "\n".join(f"- {heading}" for heading, _ in outline)
+        section_words = max(150, (word_limit - LONG_FORM_FRAME_WORDS) // len(outline))
+
+        parts = {
+            "intro": lambda: self._run(
+                "intro", use_cache=use_cache, title=title, keywords=keywords, outline=headings,
+                current_date=current_date
+            ),
+            "conclusion": lambda: self._run(
+                "conclusion", use_cache=use_cache, title=title, keywords=keywords, outline=headings,
+                current_date=current_date
+            ),
+        }
+        for index, (heading, notes) in enumerate(outline):
+            parts[index] = lambda heading=heading, notes=notes: self._run(
+                "section", use_cache=use_cache, title=title, keywords=keywords, outline=headings,
+                heading=heading, notes=notes or "(use your judgement)", research=research,
+                section_words=section_words, current_date=current_date
+            )
+
+        def write(fn):
+            # last_served_model is per thread, so read it on the worker that made the call
+            return fn(), self.last_served_model()
+
+        results = {}
+        section_models = Counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(write, fn): name for name, fn in parts.items()}
+            try:
+                for future in as_completed(futures):
+                    text, model = future.result()
+                    results[futures[future]] = text.strip()
+                    if isinstance(futures[future], int) and model:
+                        section_models[model] += 1
+                    if on_progress is not None:
+                        on_progress(len(results), len(parts))
+            except BaseException:
+                # Don't start parts nobody will use (failure or cancellation from on_progress)
+                for future in futures:
+                    future.cancel()
+                raise
+
+        sections = []
+        for index, (heading, _) in enumerate(outline):
+            section = results[index]
+            if not section.startswith("## "):
+                section = f"## {heading}\n\n{section}"
+            sections.append(section)
+
+        blog = [
+            f"# {title}",
+            f"*Last updated: {current_date}*",
+            f"## Introduction\n\n{results['intro']}",
+            *sections,
+            f"## Conclusion\n\n{results['conclusion']}",
+        ]
+        references = collect_references(sections)
+        if references:
+            blog.append("## References\n\n" + "\n".join(f"- [{name}]({url})" for name, url in references))
+        self._local.served_by = ", ".join(model for model, _ in section_models.most_common())
+        return "\n\n".join(blog)
+
+    def regenerate_section(self, blog_content, index, instructions="", keywords="", context_chars=600):
+        """Rewrite one H2 section of a blog and splice it back in place.
+
+        Only the section, the list of headings and ``context_chars`` of the
+        neighbouring sections are sent, so fixing one section costs a fraction
+        of regenerating the whole post. Returns the updated blog.
+        """
+        sections = split_markdown_sections(blog_content, levels=(2,))
+        title = re.search(r"^#\s+(.+)$", blog_content, flags=re.M)
+        headings = [section.strip().split("\n", 1)[0] for section in sections if section.lstrip().startswith("## ")]
+        previous = sections[index - 1].strip()[-context_chars:] if index > 0 else "(start of the post)"
+        following = sections[index + 1].strip()[:context_chars] if index + 1 < len(sections) else "(end of the post)"
+
+        new_section = self._run(
+            "section_rewrite",
+            use_cache=False,
+            title=title.group(1).strip() if title else "(untitled)",
+            keywords=keywords or "(not specified)",
+            outline="\n".join(headings),
+            previous=previous,
+            section=sections[index].strip(),
+            following=following,
+            instructions=instructions or "Improve its clarity, accuracy and depth.",
+            current_date=datetime.now().strftime("%B %Y")
+        )
+        heading = sections[index].strip().split("\n", 1)[0]
+        if not new_section.lstrip().startswith(heading):
+            new_section = f"{heading}\n\n{new_section.strip()}"
+        return replace_section(blog_content, index, new_section)
+
+    def _context_tokens(self, stage):
+        """Context window of the model that will serve a stage"""
+        return MODEL_CONTEXT_TOKENS.get(self._candidates(stage)[0], DEFAULT_CONTEXT_TOKENS)
+
+    def needs_chunked_qa(self, blog_content):
+        """Whether a single Q&A prompt for this content would overflow the model context"""
+        context_tokens = self._context_tokens("qa")
+        prompt_tokens = estimate_tokens(self.QA_PROMPT.template) + estimate_tokens(blog_content)
+        return prompt_tokens + self.EXPECTED_COMPLETION_TOKENS["qa"] > context_tokens * QA_CONTEXT_FRACTION
+
+    def _qa_candidates(self, blog_content, current_date, use_cache=True, max_workers=4, candidate_memo=None):
+        """Map step: extract candidate Q&A from each section chunk in parallel.
+
+        With ``candidate_memo`` every H2 section is its own chunk and chunks
+        already in the memo are not sent again; the memo is updated in place
+        and trimmed to the current chunks. The candidates are returned merged
+        down to what one reduce prompt holds (see ``_fit_candidates``).
+        """
+        context_tokens = self._context_tokens("qa_map")
+        if candidate_memo is None:
+            chunks = chunk_sections(split_markdown_sections(blog_content), max_tokens=context_tokens // 4)
+        else:
+            chunks = [
+                chunk
+                for section in split_markdown_sections(blog_content, levels=(2,))
+                for chunk in chunk_sections([section], max_tokens=context_tokens // 4)
+            ]
+        memo = candidate_memo if candidate_memo is not None else {}
+        keys = [ArtifactStore.fingerprint(chunk) for chunk in chunks]
+        missing = {key: chunk for key, chunk in zip(keys, chunks) if key not in memo}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            fresh = executor.map(
+                lambda chunk: self._run("qa_map", use_cache=use_cache, section=chunk, current_date=current_date),
+                missing.values()
+            )
+            memo.update(zip(missing, fresh))
+        if candidate_memo is not None:
+            for key in set(candidate_memo) - set(keys):
+                del candidate_memo[key]
+        return self._fit_candidates([memo[key].strip() for key in keys], current_date, use_cache, max_workers)
+
+    def _fit_candidates(self, candidates, current_date, use_cache=True, max_workers=4):
+        """Merge candidate Q&A in groups until they fit a single qa_reduce prompt.
+
+        Very large documents produce more candidates than one reduce prompt
+        holds, so groups that do fit are reduced in parallel and the results
+        merged again, level by level. Returns the joined candidates.
+        """
+        budget = (
+            self._context_tokens("qa_reduce") - estimate_tokens(self.QA_REDUCE_PROMPT.template)
+            - self.EXPECTED_COMPLETION_TOKENS["qa_reduce"]
+        )
+        while len(candidates) > 1 and estimate_tokens("\n\n".join(candidates)) > budget:
+            groups = [[]]
+            for candidate in candidates:
+                if groups[-1] and estimate_tokens("\n\n".join(groups[-1] + [candidate])) > budget:
+                    groups.append([])
+                groups[-1].append(candidate)
+            if len(groups) == len(candidates):
+                # Every candidate fills the budget on its own; pair them up so each level still shrinks
+                groups = [candidates[i:i + 2] for i in range(0, len(candidates), 2)]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                candidates = list(executor.map(
+                    lambda group: self._run(
+                        "qa_reduce", use_cache=use_cache, candidates="\n\n".join(group), current_date=current_date
+                    ).strip(),
+                    groups
+                ))
+        return "\n\n".join(candidates)
+
+    def generate_qa(self, blog_content, use_cache=True, max_workers=4, candidate_memo=None):
+        """Generate Q&A section based on blog content.
+
+        Content too large for one prompt on the selected model is split by
+        H2/H3 sections, candidate Q&A are extracted per chunk in parallel and
+        then reduced into the final FAQ. On that path a ``candidate_memo`` dict
+        switches to one chunk per H2 section and is filled with their candidates,
+        so later calls only map the sections that changed. Content that fits
+        in one prompt is always answered by a single call.
+        """
+        current_date = datetime.now().strftime("%B %Y")
+        blog_content = prepare_qa_source(blog_content)
+        if self.needs_chunked_qa(blog_content):
+            candidates = self._qa_candidates(blog_content, current_date, use_cache, max_workers, candidate_memo)
+            return self._run("qa_reduce", use_cache=use_cache, candidates=candidates, current_date=current_date)
+        result = self._run("qa", use_cache=use_cache, blog_content=blog_content, current_date=current_date)
         return result
+
+    def stream_qa(self, blog_content, use_cache=True, max_workers=4, candidate_memo=None):
+        """Stream Q&A tokens as they are generated (the map step of long content runs first)"""
+        current_date = datetime.now().strftime("%B %Y")
+        blog_content = prepare_qa_source(blog_content)
+        if self.needs_chunked_qa(blog_content):
+            candidates = self._qa_candidates(blog_content, current_date, use_cache, max_workers, candidate_memo)
+            return self._stream("qa_reduce", use_cache=use_cache, candidates=candidates, current_date=current_date)
+        return self._stream("qa", use_cache=use_cache, blog_content=blog_content, current_date=current_date)
     
-    def initialize_chatbot(self):
-        """Initialize the chatbot with memory"""
-        memory = ConversationBufferMemory()
-        return memory
-    
-    def chat_with_blog(self, memory, user_input):
-        """General purpose chat with the AI assistant"""
-        current_date = datetime.now().strftime("%Y-%m-%d")
+    def run_pipeline(self, topic, word_limit=800, include_qa=True, max_workers=2, use_cache=True,
+                     completed=None, on_stage=None, long_form=False):
+        """Run the full research -> titles -> keywords -> blog -> Q&A workflow.
 
-        prompt = PromptTemplate(
-            input_variables=["current_date", "human_input"],
-            template="""
-            **Current Date**: {current_date}
-            
-            **User Message**: {human_input}
+        Research and titles only depend on the topic, so they run concurrently;
+        keywords, blog and Q&A follow the top suggested title. With ``long_form``
+        the blog is written by ``generate_long_blog`` from the research report
+        instead of a single completion. Stage outputs in
+        ``completed`` are reused instead of regenerated and ``on_stage`` is
+        called as each new stage finishes (see ``run_stage_graph``). Returns the
+        stage outputs plus a ``timings`` dict, the ``models`` that served each
+        freshly generated stage and the end-to-end ``total_time``.
+        """
+        completed = dict(completed or {})
+        # Checkpoints written before titles and keywords were structured hold the raw text
+        for stage, parse in self.STRUCTURED_FALLBACK_PARSERS.items():
+            if isinstance(completed.get(stage), str):
+                completed[stage] = parse(completed[stage])
 
-            You are a helpful AI assistant. Provide general information and answer questions.
-            For current topics, always mention the date when providing facts or statistics.
+        def top_title(results):
+            titles = results["titles"]
+            return titles[0] if titles else topic
 
-            **Response**:
-            """
-        )
+        served_by = {}
+
+        def tracked(name, fn):
+            def run(results):
+                value = fn(results)
+                served_by[name] = self.last_served_model()
+                return value
+            return run
+
+        stages = {
+            "research": ((), lambda r: self.research_content(topic, use_cache=use_cache)),
+            "titles": ((), lambda r: self.generate_titles(topic, use_cache=use_cache)),
+            "keywords": (("titles",), lambda r: self.generate_keywords(top_title(r), use_cache=use_cache)),
+            "blog": (("titles", "keywords"), lambda r: self.generate_blog(
+                top_title(r), keyword_text(r["keywords"]), word_limit, use_cache=use_cache
+            )),
+        }
+        if long_form:
+            stages["blog"] = (("titles", "keywords", "research"), lambda r: self.generate_long_blog(
+                top_title(r), keyword_text(r["keywords"]), word_limit, research=r["research"], use_cache=use_cache,
+                max_workers=max(2, max_workers)
+            ))
+        if include_qa:
+            stages["qa"] = (("blog",), lambda r: self.generate_qa(r["blog"], use_cache=use_cache))
+
+        stages = {name: (deps, tracked(name, fn)) for name, (deps, fn) in stages.items()}
 
-        chain = LLMChain(
-            llm=self.llm,
-            prompt=prompt,
-            verbose=True
+        start = time.perf_counter()
+        results, timings = run_stage_graph(
+            stages, max_workers=max_workers, completed=completed, on_complete=on_stage
         )
+        results["title"] = top_title(results)
+        results["models"] = served_by
+        results["timings"] = timings
+        results["total_time"] = time.perf_counter() - start
+        return results
+
+    def initialize_chatbot(self, max_recent_tokens=1200):
+        """Initialize the chatbot with memory"""
+        memory = SummaryWindowMemory(max_recent_tokens=max_recent_tokens)
+        return memory
+
+    def summarize_conversation(self, summary, lines):
+        """Fold conversation lines into a rolling summary"""
+        return self._run("chat_summary", summary=summary or "(none yet)", new_lines=lines).strip()
+    
+    def chat_with_blog(self, memory, user_input, blog_content=None, max_blog_tokens=1500):
+        """General purpose chat with the AI assistant.
+
+        Earlier turns come from ``memory`` and, when ``blog_content`` is given,
+        its first ``max_blog_tokens`` tokens are included as context.
+        """
+        current_date = datetime.now().strftime("%Y-%m-%d")
+        blog_context = ""
+        if blog_content:
+            excerpt = blog_content[:max_blog_tokens * 4]
+            blog_context = f"**Blog Being Edited**:\n{excerpt}"
 
         try:
-            response = chain.run(
+            response = self._run(
+                "chat",
                 current_date=current_date,
-                human_input=user_input
+                human_input=user_input,
+                history=memory.context() or "(no previous messages)",
+                blog_context=blog_context
             )
-            return response
         except Exception as e:
             return f"Error generating response: {str(e)}"
-        
+
+        memory.add_turn("user", user_input)
+        memory.add_turn("assistant", response)
+        try:
+            memory.compact(self.summarize_conversation)
+        except Exception:
+            # Summarizing is best effort; the overflow is retried on the next turn
+            pass
+        return response
+
+
+class SummaryWindowMemory:
+    """Token-budgeted chat memory: recent turns verbatim plus a rolling summary.
+
+    Turns beyond ``max_recent_tokens`` are folded into ``summary`` by
+    ``compact``, so the history sent with each message stays roughly constant
+    in size however long the conversation gets.
+    """
+
+    def __init__(self, max_recent_tokens=1200):
+        self.max_recent_tokens = max_recent_tokens
+        self.summary = ""
+        self.turns = deque()
+
+    @staticmethod
+    def format_turn(role, content):
+        return f"{'User' if role == 'user' else 'Assistant'}: {content}"
+
+    def add_turn(self, role, content):
+        self.turns.append((role, content))
+
+    def recent_tokens(self):
+        return sum(estimate_tokens(self.format_turn(role, content)) for role, content in self.turns)
+
+    def compact(self, summarize_fn):
+        """Move the oldest turns into the summary until the recent window fits the budget.
+
+        The latest exchange is always kept verbatim.
+        """
+        overflow = []
+        while len(self.turns) > 2 and self.recent_tokens() > self.max_recent_tokens:
+            overflow.append(self.turns.popleft())
+        if overflow:
+            lines = "\n".join(self.format_turn(role, content) for role, content in overflow)
+            try:
+                self.summary = summarize_fn(self.summary, lines)
+            except Exception:
+                self.turns.extendleft(reversed(overflow))
+                raise
+
+    def context(self):
+        """Render the summary and recent turns for the chat prompt"""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation: {self.summary}")
+        parts.extend(self.format_turn(role, content) for role, content in self.turns)
+        return "\n".join(parts)
+
+
+class GeneratorPool:
+    """Process-wide pool of BlogGenerator instances.
+
+    Generators are keyed by a hash of the API key, the model, the temperature
+    and whether the response cache, model routing and coalescing are enabled,
+    so every session using the same settings shares one ChatGroq client (and
+    its keep-alive HTTP connections) and one set of compiled chains. Only the
+    ``max_generators`` most recently used are kept, so keys from sessions that
+    have ended are dropped instead of staying in memory for the process life.
+    """
+
+    def __init__(self, max_generators=64):
+        self.max_generators = max_generators
+        self._generators = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, groq_api_key, model_name, temperature=0.7, cache=None, limiter=None, metrics=None,
+            router=None, coalescer=None):
+        """Return the pooled generator for these settings, creating it if needed"""
+        key_hash = hashlib.sha256(groq_api_key.encode("utf-8")).hexdigest()
+        pool_key = (
+            key_hash, model_name, temperature, cache is not None, router is not None, coalescer is not None
+        )
+        with self._lock:
+            generator = self._generators.get(pool_key)
+            if generator is None:
+                generator = BlogGenerator(
+                    groq_api_key, model_name, temperature=temperature, cache=cache, limiter=limiter,
+                    metrics=metrics, router=router, coalescer=coalescer
+                )
+                self._generators[pool_key] = generator
+                while len(self._generators) > self.max_generators:
+                    self._generators.popitem(last=False)
+            else:
+                self._generators.move_to_end(pool_key)
+            return generator
+
+    def __len__(self):
+        return len(self._generators)
+
+# Number of chat messages rendered per page in the Chat Assistant tab
+CHAT_PAGE_SIZE = 20
+
+# Keyword prefetches a single session may run at the same time
+KEYWORD_PREFETCH_CONCURRENCY = 2
+
+# Generation jobs running at once across all sessions
+JOB_WORKERS = 4
+
+# Seconds between reruns while a session has jobs in flight
+JOB_POLL_SECONDS = 1.0
+
+
+@st.cache_resource
+def get_response_cache():
+    """Process-wide response cache shared by every session"""
+    return ResponseCache()
+
+
+@st.cache_resource
+def get_rate_limiter():
+    """Process-wide Groq rate limiter shared by every session"""
+    return RateLimiter()
+
+
+@st.cache_resource
+def get_instrumentation():
+    """Process-wide call instrumentation.
+
+    Records are kept in memory for the sidebar panel and aggregated for
+    Prometheus. Set BLOGGER_METRICS_FILE to also append them to a JSONL file and
+    BLOGGER_METRICS_PORT to serve the Prometheus text at /metrics on that port.
+    """
+    prometheus = PrometheusSink()
+    sinks = [RingBufferSink(), prometheus]
+    if os.environ.get("BLOGGER_METRICS_FILE"):
+        sinks.append(JsonlSink(os.environ["BLOGGER_METRICS_FILE"]))
+    if os.environ.get("BLOGGER_METRICS_PORT"):
+        prometheus.serve(int(os.environ["BLOGGER_METRICS_PORT"]))
+    return Instrumentation(sinks)
+
+
+@st.cache_resource
+def get_content_archive():
+    """Process-wide archive of generated content shared by every session"""
+    return ContentArchive()
+
+
+@st.cache_resource
+def get_request_coalescer():
+    """Process-wide single-flight coalescer, so identical requests from different sessions share one call"""
+    return RequestCoalescer()
+
+
+@st.cache_resource
+def get_model_router():
+    """Process-wide model router, so model health is learned from every session"""
+    return ModelRouter()
+
+
+@st.cache_resource
+def get_job_runner():
+    """Process-wide background worker pool for generation jobs"""
+    return JobRunner(max_workers=JOB_WORKERS)
+
+
+@st.cache_resource
+def get_generator_pool():
+    """Process-wide generator pool shared by every session and rerun"""
+    return GeneratorPool()
+
+
+def render_job(runner, job, label):
+    """Show a job's progress and partial output with a cancel button, or how it ended"""
+    if job is None:
+        return
+    if job.active:
+        status = job.message or ("waiting for a worker" if job.status == "queued" else "running")
+        st.progress(job.progress, text=f"{label}: {status}")
+        if job.partial:
+            st.markdown(job.partial)
+        if st.button("Cancel", key=f"cancel_{job.id}"):
+            runner.cancel(job.id)
+            st.rerun()
+    elif job.status == "failed":
+        st.error(f"{label} failed: {job.error}")
+    elif job.status == "cancelled":
+        st.caption(f"{label} was cancelled")
+
+
 def main():
     st.set_page_config(
         page_title="AI Blog Generator Pro",
@@ -251,7 +2830,49 @@ def main():
         
         if groq_api_key:
             st.success("API key configured!")
-        
+
+        use_response_cache = st.checkbox(
+            "Cache responses on disk",
+            value=False,
+            help="Reuse identical completions from earlier runs instead of calling Groq again"
+        )
+        if use_response_cache:
+            cache_stats = get_response_cache().stats()
+            st.caption(
+                f"Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                f"{cache_stats['entries']} entries"
+            )
+            if st.button("Clear Cache"):
+                get_response_cache().clear()
+
+        route_models = st.checkbox(
+            "Route stages across models",
+            value=True,
+            help="Send titles and keywords to a fast model, fall back to another model on errors, "
+                 "rate limits or slow responses. The selected model leads the quality stages."
+        )
+
+        use_archive = st.checkbox(
+            "Archive generated content",
+            value=True,
+            help="Keep research, titles, keywords and posts in a local searchable archive and offer to "
+                 "reuse research for topics that were covered before"
+        )
+
+        prefetch_keywords = st.checkbox(
+            "Prefetch keywords for suggested titles",
+            value=True,
+            help="Generate keywords for every suggested title in the background so picking one is instant"
+        )
+
+        import_profiler = import_profile.active_profiler()
+        if import_profiler is not None:
+            with st.expander("Import profile"):
+                st.caption(f"{import_profiler.total_seconds():.2f}s spent importing modules so far")
+                for module_name, seconds in import_profiler.slowest(5):
+                    st.caption(f"{module_name}: {seconds * 1000:.0f} ms")
+                st.code(import_profiler.report(min_cumulative=0.005), language=None)
+
         st.markdown("---")
         st.markdown("### Features")
         st.markdown("- Up-to-date Research Assistant")
@@ -265,21 +2886,129 @@ def main():
         return
     
     # Initialize blog generator
-    generator = BlogGenerator(groq_api_key, model_name)
+    generator = get_generator_pool().get(
+        groq_api_key,
+        model_name,
+        cache=get_response_cache() if use_response_cache else None,
+        limiter=get_rate_limiter(),
+        metrics=get_instrumentation(),
+        router=get_model_router() if route_models else None,
+        coalescer=get_request_coalescer()
+    )
     
     # Initialize session state variables
+    if 'artifacts' not in st.session_state:
+        st.session_state.artifacts = ArtifactStore()
     if 'selected_title' not in st.session_state:
         st.session_state.selected_title = ""
-    if 'research_data' not in st.session_state:
-        st.session_state.research_data = None
-    if 'generated_blog' not in st.session_state:
-        st.session_state.generated_blog = None
-    if 'show_qa' not in st.session_state:
-        st.session_state.show_qa = False
     if 'chat_memory' not in st.session_state:
         st.session_state.chat_memory = generator.initialize_chatbot()
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
+    if 'stream_timings' not in st.session_state:
+        st.session_state.stream_timings = {}
+    if 'pipeline_timings' not in st.session_state:
+        st.session_state.pipeline_timings = {}
+    if 'pipeline_checkpoints' not in st.session_state:
+        st.session_state.pipeline_checkpoints = {}
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = os.urandom(8).hex()
+    if 'qa_candidates' not in st.session_state:
+        st.session_state.qa_candidates = {}
+    if 'keyword_prefetcher' not in st.session_state:
+        st.session_state.keyword_prefetcher = KeywordPrefetcher(max_concurrent=KEYWORD_PREFETCH_CONCURRENCY)
+
+    artifacts = st.session_state.artifacts
+    # Background jobs update these objects directly, so they are bound once here
+    stream_timings = st.session_state.stream_timings
+    pipeline_timings = st.session_state.pipeline_timings
+    pipeline_checkpoints = st.session_state.pipeline_checkpoints
+    session_id = st.session_state.session_id
+    jobs = get_job_runner()
+    archive = get_content_archive() if use_archive else None
+    # Archived documents are scoped to the API key, so other sessions never see them
+    artifacts.on_put = (
+        (lambda artifact: archive.record_artifact(artifact, account=generator.account)) if archive else None
+    )
+
+    with st.sidebar:
+        with st.expander("Session artifacts"):
+            st.caption(f"LLM generations this session: {sum(artifacts.compute_counts.values())}")
+            for name, version, computed, served_by in artifacts.summary():
+                model_note = f" by {served_by}" if served_by else ""
+                st.caption(f"{name}: v{version}, computed {computed}x{model_note}")
+        if archive:
+            with st.expander("Archive"):
+                archive_counts = archive.stats(account=generator.account)
+                st.caption(", ".join(f"{count} {kind}" for kind, count in sorted(archive_counts.items()))
+                           or "Nothing archived yet")
+                archive_query = st.text_input("Search the archive:", key="archive_query")
+                archive_kind = st.selectbox("Type:", ["all", "research", "titles", "keywords", "post"])
+                if archive_query:
+                    hits = archive.search(archive_query, kind=None if archive_kind == "all" else archive_kind,
+                                          limit=10, account=generator.account)
+                    if not hits:
+                        st.caption("No matches")
+                    for hit in hits:
+                        created = datetime.fromtimestamp(hit["created"]).strftime("%Y-%m-%d")
+                        st.markdown(f"**{hit['kind']}** · {hit['title'] or hit['topic']} · {created}")
+                        st.caption(hit["snippet"])
+        with st.expander("Performance"):
+            stage_summary = summarize_records(get_instrumentation().records())
+            if not stage_summary:
+                st.caption("No LLM calls recorded yet")
+            else:
+                st.dataframe(
+                    [
+                        {
+                            "stage": stage,
+                            "calls": stats["calls"],
+                            "cache hits": stats["cache_hits"],
+                            "coalesced": stats["coalesced"],
+                            "p50 (s)": round(stats["p50"], 2),
+                            "p95 (s)": round(stats["p95"], 2),
+                            "first token p50 (s)": round(stats["ttft_p50"], 2) if stats["ttft_p50"] else None,
+                            "tokens": stats["prompt_tokens"] + stats["completion_tokens"],
+                            "cost ($)": round(stats["cost"], 4),
+                        }
+                        for stage, stats in stage_summary.items()
+                    ],
+                    hide_index=True
+                )
+        if route_models:
+            with st.expander("Model routing"):
+                router_stats = get_model_router().stats()
+                if not router_stats:
+                    st.caption("No routed calls yet")
+                for routed_model, stats in router_stats.items():
+                    st.caption(
+                        f"{routed_model}: {stats['state']}, served {stats['served']}, "
+                        f"{stats['failures']} failures ({stats['error_rate']:.0%} recent errors)"
+                    )
+        with st.expander("Request coalescing"):
+            coalescer_stats = get_request_coalescer().stats()
+            saved = sum(stats["saved"] for stats in coalescer_stats.values())
+            st.caption(f"Identical in-flight requests joined instead of repeated: {saved}")
+            for coalesced_stage, stats in coalescer_stats.items():
+                if stats["saved"]:
+                    st.caption(f"{coalesced_stage}: {stats['saved']} saved of {stats['calls'] + stats['saved']}")
+        with st.expander("Background jobs"):
+            session_jobs = jobs.jobs(session_id)
+            if not session_jobs:
+                st.caption("No jobs yet")
+            for job in session_jobs:
+                st.caption(f"{job.name.split(':')[0]}: {job.status} ({job.progress:.0%})")
+        with st.expander("Rate limiting"):
+            limiter_stats = get_rate_limiter().stats()
+            if not limiter_stats:
+                st.caption("No Groq requests yet")
+            for limited_model, stats in limiter_stats.items():
+                average_wait = stats["queue_wait"] / stats["requests"] if stats["requests"] else 0
+                st.caption(
+                    f"{limited_model}: {stats['requests']} requests, {stats['retries']} retries, "
+                    f"{stats['failures']} failures, avg queue wait {average_wait:.2f}s "
+                    f"(max {stats['max_queue_wait']:.2f}s)"
+                )
     
     st.title("AI Blog Generator Pro ✍️")
     st.write("Generate blog posts with current research and Q&A capabilities")
@@ -291,35 +3020,124 @@ def main():
         st.header("Research Phase")
         topic = st.text_input("Enter your blog topic:", 
                             placeholder="e.g., EV industry")
-        
+        # Keyword prefetches for an earlier topic are no longer useful
+        st.session_state.keyword_prefetcher.set_topic(topic)
+
+        research_data = artifacts.get("research", topic=topic) if topic else None
+        if topic and not research_data and archive:
+            # Offer research from the archive for near-identical topics before paying for a new call
+            for match in archive.similar(topic, kind="research", account=generator.account):
+                created = datetime.fromtimestamp(match["created"]).strftime("%Y-%m-%d")
+                st.info(
+                    f"Existing research for \"{match['topic']}\" ({match['similarity']:.0%} match, {created}). "
+                    "Reuse it, or click Research Topic to refresh it."
+                )
+                if st.button("Reuse this research", key=f"reuse_research_{match['id']}"):
+                    research_data = archive.content(match["id"], account=generator.account)
+                    artifacts.put("research", research_data, served_by="archive", topic=topic)
+                    break
         if topic:
-            # Clear previous research if topic changes
-            if 'previous_topic' in st.session_state and st.session_state.previous_topic != topic:
-                st.session_state.research_data = None
-                st.session_state.titles = None
-                st.session_state.generated_blog = None
-                st.session_state.selected_title = ""
-            
-            st.session_state.previous_topic = topic
-            
-            if st.button("Research Topic") or st.session_state.research_data:
-                if not st.session_state.research_data:
-                    with st.spinner("Gathering current research data..."):
-                        try:
-                            st.session_state.research_data = generator.research_content(topic)
-                            # Add timestamp to research data
-                            current_date = datetime.now().strftime("%Y-%m-%d")
-                            st.session_state.research_data = f"# Research Report (Generated {current_date})\n\n" + st.session_state.research_data
-                        except Exception as e:
-                            st.error(f"An error occurred during research: {str(e)}")
-                            st.session_state.research_data = "Research data unavailable due to technical issues. Please try again later."
-                
+            research_clicked = st.button("Research Topic")
+            regenerate_research = bool(research_data) and st.button("Regenerate Research")
+
+            with st.expander("One-click pipeline"):
+                st.caption("Research, titles, keywords, blog and Q&A in one go, running independent stages in parallel")
+                pipeline_long_form = st.checkbox(
+                    "Long-form mode", key="pipeline_long_form",
+                    help="Outline first, then write the sections in parallel (1500+ words)"
+                )
+                if pipeline_long_form:
+                    pipeline_word_limit = st.slider(
+                        "Blog word limit:", min_value=1500, max_value=6000, value=3000, step=500,
+                        key="pipeline_long_word_limit"
+                    )
+                else:
+                    pipeline_word_limit = st.slider(
+                        "Blog word limit:", min_value=200, max_value=1000, value=800, step=100,
+                        key="pipeline_word_limit"
+                    )
+                pipeline_workers = st.slider(
+                    "Parallel requests:", min_value=1, max_value=4, value=2, key="pipeline_workers"
+                )
+                pipeline_job = jobs.latest(session_id, f"pipeline:{topic}")
+                if st.button("Run Full Pipeline") and not (pipeline_job and pipeline_job.active):
+                    def run_pipeline_job(job, word_limit=pipeline_word_limit, workers=pipeline_workers,
+                                         long_form=pipeline_long_form):
+                        # Stages finished by an earlier failed run are reused instead of paid for again
+                        checkpoint_key = (topic, word_limit, long_form)
+                        finished = pipeline_checkpoints.setdefault(checkpoint_key, {})
+
+                        def on_stage(stage, output, seconds):
+                            finished[stage] = output
+                            job.report(progress=len(finished) / 5, message=f"{stage} done in {seconds:.1f}s")
+
+                        job.report(message="researching and suggesting titles")
+                        results = generator.run_pipeline(
+                            topic, word_limit=word_limit, max_workers=workers, completed=dict(finished),
+                            on_stage=on_stage, long_form=long_form
+                        )
+                        pipeline_checkpoints.pop(checkpoint_key, None)
+                        results["word_limit"] = word_limit
+                        results["long_form"] = long_form
+                        return results
+
+                    def store_pipeline(results):
+                        blog_content = stamp_blog(results["blog"])
+                        served_by = results["models"]
+                        artifacts.put(
+                            "research", format_research_report(results["research"]),
+                            served_by=served_by.get("research"), topic=topic
+                        )
+                        artifacts.put("titles", results["titles"], served_by=served_by.get("titles"), topic=topic)
+                        artifacts.put(
+                            "keywords", results["keywords"], served_by=served_by.get("keywords"),
+                            title=results["title"]
+                        )
+                        artifacts.put(
+                            "blog", blog_content, served_by=served_by.get("blog"), topic=topic,
+                            title=results["title"], keywords=keyword_text(results["keywords"]),
+                            word_limit=results["word_limit"], long_form=results["long_form"]
+                        )
+                        artifacts.put("qa", results["qa"], served_by=served_by.get("qa"), blog=blog_content)
+                        stream_timings.clear()
+                        pipeline_timings.clear()
+                        pipeline_timings.update(results["timings"], total=results["total_time"])
+
+                    pipeline_job = jobs.submit(
+                        session_id, f"pipeline:{topic}", run_pipeline_job, on_done=store_pipeline
+                    )
+                render_job(jobs, pipeline_job, "Full pipeline")
+                if pipeline_timings:
+                    st.caption(" | ".join(
+                        f"{stage}: {seconds:.1f}s" for stage, seconds in pipeline_timings.items()
+                    ))
+
+            research_job = jobs.latest(session_id, f"research:{topic}")
+            if ((research_clicked and not research_data) or regenerate_research) and not (
+                    research_job and research_job.active):
+                def run_research(job, use_cache=not regenerate_research):
+                    stream = generator.stream_research_content(topic, use_cache=use_cache)
+                    text = drain_stream(job, stream, generator.EXPECTED_COMPLETION_TOKENS["research"])
+                    stream_timings["research"] = stream.timing_summary()
+                    return format_research_report(text)
+
+                research_job = jobs.submit(
+                    session_id, f"research:{topic}", run_research,
+                    on_done=lambda value: artifacts.put(
+                        "research", value, served_by=generator.last_served_model(), topic=topic
+                    )
+                )
+            render_job(jobs, research_job, "Research")
+
+            if research_data:
                 st.subheader("Research Findings")
-                st.markdown(st.session_state.research_data)
+                st.markdown(research_data)
+                if stream_timings.get("research"):
+                    st.caption(stream_timings["research"])
                 
                 st.download_button(
                     label="Download Research Notes",
-                    data=st.session_state.research_data,
+                    data=research_data,
                     file_name=f"{topic[:30]}_research_{datetime.now().strftime('%Y%m%d')}.md",
                     mime="text/markdown"
                 )
@@ -327,143 +3145,285 @@ def main():
     with tab2:
         st.header("Content Creation")
         
-        if not st.session_state.get('research_data'):
+        if not research_data:
             st.info("Complete the Research phase first")
-            st.stop()
-            
-        # Step 2: Generate title suggestions
-        if st.button("Generate Title Suggestions") or 'titles' in st.session_state:
-            with st.spinner("Generating current title suggestions..."):
-                if 'titles' not in st.session_state:
-                    st.session_state.titles = generator.generate_titles(st.session_state.previous_topic)
-                
+        else:
+
+            # Step 2: Generate title suggestions (stored as a validated list, so reruns do no parsing)
+            titles_list = artifacts.get("titles", topic=topic) or []
+            if st.button("Generate Title Suggestions"):
+                with st.spinner("Generating current title suggestions..."):
+                    try:
+                        titles_list = artifacts.compute(
+                            "titles", lambda: generator.generate_titles(topic),
+                            served_by=generator.last_served_model, topic=topic
+                        )
+                    except Exception as e:
+                        st.error(f"An error occurred while generating titles: {str(e)}")
+
+            def keywords_with_model(title):
+                # last_served_model is per thread, so prefetch workers report it with the keywords
+                return generator.generate_keywords(title), generator.last_served_model()
+
+            if titles_list:
+                if prefetch_keywords:
+                    # Start keywords for every suggestion so picking a title is instant
+                    st.session_state.keyword_prefetcher.prefetch(topic, titles_list, keywords_with_model)
+
                 st.subheader("Suggested Titles:")
-                titles_list = [title.strip() for title in st.session_state.titles.split('\n') if title.strip()]
-                for i, title in enumerate(titles_list, 1):
-                    # Handle both "1. Title" and "Title" formats
-                    title_text = title.split('. ', 1)[1] if '. ' in title else title
+                for i, title_text in enumerate(titles_list, 1):
                     st.write(f"{i}. {title_text}")
-        
-        # Step 3: Let user select or enter a title
-        title_options = st.radio(
-            "Choose an option:",
-            ("Select from suggestions", "Enter custom title"),
-            horizontal=True,
-            key="title_option"
-        )
-        
-        if title_options == "Select from suggestions":
-            if 'titles' in st.session_state:
-                titles_list = [title.strip() for title in st.session_state.titles.split('\n') if title.strip()]
-                title_options_list = [title.split('. ', 1)[1] if '. ' in title else title for title in titles_list]
-                
-                selected_title = st.selectbox(
-                    "Select a title:",
-                    options=title_options_list,
-                    key="title_select"
-                )
-                st.session_state.selected_title = selected_title
-            else:
-                st.warning("Please generate title suggestions first")
-        else:
-            st.session_state.selected_title = st.text_input(
-                "Enter your custom title:",
-                key="custom_title",
-                help="Include the current year if relevant (e.g., '2024')"
+
+            # Step 3: Let user select or enter a title
+            title_options = st.radio(
+                "Choose an option:",
+                ("Select from suggestions", "Enter custom title"),
+                horizontal=True,
+                key="title_option"
             )
-        
-        if st.session_state.selected_title:
-            # Step 4: Keyword generation
-            if st.button("Suggest Keywords") or 'suggested_keywords' in st.session_state:
-                with st.spinner("Generating current keyword suggestions..."):
-                    if 'suggested_keywords' not in st.session_state:
-                        st.session_state.suggested_keywords = generator.generate_keywords(st.session_state.selected_title)
-                    
+
+            if title_options == "Select from suggestions":
+                if titles_list:
+                    selected_title = st.selectbox(
+                        "Select a title:",
+                        options=titles_list,
+                        key="title_select"
+                    )
+                    st.session_state.selected_title = selected_title
+                else:
+                    st.warning("Please generate title suggestions first")
+                    st.session_state.selected_title = ""
+            else:
+                st.session_state.selected_title = st.text_input(
+                    "Enter your custom title:",
+                    key="custom_title",
+                    help="Include the current year if relevant (e.g., '2024')"
+                )
+
+            selected_title = st.session_state.selected_title
+            if selected_title:
+                # Step 4: Keyword generation
+                prefetcher = st.session_state.keyword_prefetcher
+                suggested_keywords = artifacts.get("keywords", title=selected_title)
+                if suggested_keywords is None:
+                    prefetched = prefetcher.result(selected_title)
+                    if prefetched is not None:
+                        suggested_keywords, served_by = prefetched
+                        artifacts.put("keywords", suggested_keywords, served_by=served_by, title=selected_title)
+                if st.button("Suggest Keywords"):
+                    with st.spinner("Generating current keyword suggestions..."):
+                        fetched = {}
+
+                        def fetch_keywords():
+                            # Wait for an in-flight prefetch rather than paying for the same call twice
+                            fetched["keywords"], fetched["model"] = (
+                                prefetcher.result(selected_title, timeout=None)
+                                or keywords_with_model(selected_title)
+                            )
+                            return fetched["keywords"]
+
+                        try:
+                            suggested_keywords = artifacts.compute(
+                                "keywords", fetch_keywords, served_by=lambda: fetched.get("model"), title=selected_title
+                            )
+                        except Exception as e:
+                            st.error(f"An error occurred while generating keywords: {str(e)}")
+
+                if suggested_keywords:
+                    suggested_text = keyword_text(suggested_keywords)
                     st.subheader("Suggested Keywords:")
-                    st.write(st.session_state.suggested_keywords)
+                    st.write(suggested_text)
                     st.info("You can copy these and edit as needed below")
-            
-            # Keyword input with suggested keywords as default
-            default_keywords = st.session_state.get('suggested_keywords', '')
-            keywords = st.text_area(
-                "Enter keywords (comma-separated):",
-                value=default_keywords,
-                height=100,
-                key="keywords_input",
-                help="Include current year if relevant"
-            )
-            
-            # Word limit input
-            word_limit = st.slider(
-                "Select word limit:",
-                min_value=200,
-                max_value=1000,
-                value=800,
-                step=100,
-                key="word_limit"
-            )
-            
-            # Step 5: Generate full blog
-            if st.button("Generate Blog Post") and keywords:
-                with st.spinner(f"Generating your {word_limit}-word blog post with current information..."):
-                    try:
-                        blog_content = generator.generate_blog(
-                            st.session_state.selected_title, 
+                    # Refresh the editable keywords whenever the suggestions for the selected title change
+                    if st.session_state.get("keywords_source") != (selected_title, suggested_text):
+                        st.session_state.keywords_input = suggested_text
+                        st.session_state.keywords_source = (selected_title, suggested_text)
+                elif prefetcher.pending():
+                    st.caption("Preparing keyword suggestions in the background...")
+
+                # Keyword input with suggested keywords as default
+                keywords = st.text_area(
+                    "Enter keywords (comma-separated):",
+                    height=100,
+                    key="keywords_input",
+                    help="Include current year if relevant"
+                )
+
+                long_form = st.checkbox(
+                    "Long-form mode",
+                    key="long_form",
+                    help="Generate an outline first, then write every section in parallel. Suited to 1500+ word posts."
+                )
+
+                # Word limit input
+                if long_form:
+                    word_limit = st.slider(
+                        "Select word limit:",
+                        min_value=1500,
+                        max_value=6000,
+                        value=3000,
+                        step=500,
+                        key="long_word_limit"
+                    )
+                else:
+                    word_limit = st.slider(
+                        "Select word limit:",
+                        min_value=200,
+                        max_value=1000,
+                        value=800,
+                        step=100,
+                        key="word_limit"
+                    )
+
+                blog_inputs = {
+                    "topic": topic, "title": selected_title, "keywords": keywords, "word_limit": word_limit,
+                    "long_form": long_form
+                }
+
+                # Step 5: Generate full blog
+                generate_clicked = st.button("Generate Blog Post")
+                blog_content = artifacts.get("blog", **blog_inputs)
+                regenerate_blog = bool(blog_content) and st.button("Regenerate Blog Post")
+                blog_job = jobs.latest(session_id, "blog")
+                if ((generate_clicked and not blog_content) or regenerate_blog) and keywords and not (
+                        blog_job and blog_job.active):
+                    def run_long_blog(job):
+                        job.report(message="writing the outline")
+                        start = time.perf_counter()
+                        blog = generator.generate_long_blog(
+                            selected_title,
                             keywords,
-                            word_limit
+                            word_limit,
+                            research=research_data,
+                            use_cache=not regenerate_blog,
+                            on_progress=lambda done, total: job.report(
+                                progress=done / total, message=f"written {done} of {total} parts"
+                            )
                         )
-                        
-                        # Add timestamp to generated blog
-                        current_date = datetime.now().strftime("%Y-%m-%d")
-                        blog_content = f"<!-- Generated on {current_date} -->\n\n" + blog_content
-                        
-                        st.session_state.generated_blog = blog_content
-                        st.session_state.show_qa = False  # Reset Q&A visibility
-                        
-                        st.subheader("Generated Blog Post")
-                        st.markdown(blog_content)
-                        
-                        # Word count estimation
-                        word_count = len(blog_content.split())
-                        st.caption(f"Estimated word count: {word_count} words")
-                    except Exception as e:
-                        st.error(f"An error occurred while generating the blog: {str(e)}")
+                        stream_timings["blog"] = f"blog: long-form, complete in {time.perf_counter() - start:.2f}s"
+                        return stamp_blog(blog)
+
+                    def run_blog(job):
+                        stream = generator.stream_blog(
+                            selected_title,
+                            keywords,
+                            word_limit,
+                            use_cache=not regenerate_blog
+                        )
+                        text = drain_stream(job, stream, expected_tokens=int(word_limit * 1.4))
+                        stream_timings["blog"] = stream.timing_summary()
+                        return stamp_blog(text)
+
+                    blog_job = jobs.submit(
+                        session_id, "blog", run_long_blog if long_form else run_blog,
+                        on_done=lambda value: artifacts.put(
+                            "blog", value, served_by=generator.last_served_model(), **blog_inputs
+                        )
+                    )
+                render_job(jobs, blog_job, "Blog post")
+
+                if blog_content:
+                    # Word count estimation
+                    word_count = len(blog_content.split())
+                    st.caption(f"Estimated word count: {word_count} words. The post is in the Final Output tab.")
+                    if stream_timings.get("blog"):
+                        st.caption(stream_timings["blog"])
 
     with tab3:
         st.header("Final Output")
-        
-        if not st.session_state.get('generated_blog'):
+
+        blog_artifact = artifacts.latest("blog")
+        if blog_artifact is None or blog_artifact.inputs["topic"] != topic:
             st.info("Generate a blog post in the Content Creation tab first")
-            st.stop()
-            
-        st.markdown(st.session_state.generated_blog)
-        
-        # Q&A Generation Section
-        if st.button("Generate Q&A Section"):
-            with st.spinner("Creating comprehensive Q&A section with current information..."):
-                try:
-                    qa_content = generator.generate_qa(st.session_state.generated_blog)
-                    st.session_state.generated_blog += "\n\n" + qa_content
-                    st.session_state.show_qa = True
-                except Exception as e:
-                    st.error(f"An error occurred while generating Q&A: {str(e)}")
-                
-        if st.session_state.show_qa:
-            st.markdown("---")
-            st.subheader("Q&A Section")
-            qa_content = generator.generate_qa(st.session_state.generated_blog)
-            st.markdown(qa_content)
-        
-        # Final download button
-        current_date = datetime.now().strftime("%Y%m%d")
-        st.download_button(
-            label="Download Full Content",
-            data=st.session_state.generated_blog,
-            file_name=f"{st.session_state.selected_title[:50].lower().replace(' ', '_')}_{current_date}.md",
-            mime="text/markdown",
-            key="final_download"
-        )
-    
+        else:
+
+            generated_blog = blog_artifact.value
+
+            blog_sections = split_markdown_sections(generated_blog, levels=(2,))
+            # Numbered labels keep sections with identical headings apart
+            editable_sections = {
+                f"{number}. {blog_sections[index].strip().split(chr(10), 1)[0][3:]}": index
+                for number, index in enumerate(
+                    (index for index, section in enumerate(blog_sections) if section.lstrip().startswith("## ")), 1
+                )
+            }
+            if editable_sections:
+                with st.expander("Regenerate a section"):
+                    section_label = st.selectbox("Section:", list(editable_sections))
+                    section_index = editable_sections[section_label]
+                    section_instructions = st.text_input(
+                        "What should change? (optional)",
+                        placeholder="e.g., add a recent statistic, make it more concise"
+                    )
+                    section_job = jobs.latest(session_id, "section")
+                    if st.button("Regenerate Section") and not (section_job and section_job.active):
+                        edited_blog = blog_artifact
+
+                        def run_section(job):
+                            job.report(message=f"rewriting {section_label}")
+                            return generator.regenerate_section(
+                                edited_blog.value,
+                                section_index,
+                                instructions=section_instructions,
+                                keywords=edited_blog.inputs.get("keywords", "")
+                            )
+
+                        # Same inputs, so tab2 still recognises the edited post as current
+                        section_job = jobs.submit(
+                            session_id, "section", run_section,
+                            on_done=lambda value: artifacts.put(
+                                "blog", value, served_by=generator.last_served_model(),
+                                edits=edited_blog.edits + 1, **edited_blog.inputs
+                            )
+                        )
+                    render_job(jobs, section_job, "Section rewrite")
+                    if blog_artifact.edits:
+                        st.caption(f"Sections rewritten in this post: {blog_artifact.edits}")
+
+            st.markdown(generated_blog)
+
+            # Q&A Generation Section
+            qa_inputs = {"blog": generated_blog}
+            qa_content = artifacts.get("qa", **qa_inputs)
+            # Posts too long for one Q&A prompt keep per-section candidates here, so after a
+            # section edit only that section is read again
+            qa_memo = st.session_state.qa_candidates
+            qa_job = jobs.latest(session_id, "qa")
+            if st.button("Generate Q&A Section") and not qa_content and not (qa_job and qa_job.active):
+                def run_qa(job):
+                    job.report(message="reading the post")
+                    stream = generator.stream_qa(generated_blog, candidate_memo=qa_memo)
+                    text = drain_stream(job, stream, generator.EXPECTED_COMPLETION_TOKENS["qa"])
+                    stream_timings["qa"] = stream.timing_summary()
+                    return text
+
+                qa_job = jobs.submit(
+                    session_id, "qa", run_qa,
+                    on_done=lambda value: artifacts.put(
+                        "qa", value, served_by=generator.last_served_model(), **qa_inputs
+                    )
+                )
+            render_job(jobs, qa_job, "Q&A")
+
+            full_content = generated_blog
+            if qa_content:
+                st.markdown("---")
+                st.subheader("Q&A Section")
+                st.markdown(qa_content)
+                if stream_timings.get("qa"):
+                    st.caption(stream_timings["qa"])
+                full_content += "\n\n" + qa_content
+
+            # Final download button
+            current_date = datetime.now().strftime("%Y%m%d")
+            st.download_button(
+                label="Download Full Content",
+                data=full_content,
+                file_name=f"{st.session_state.selected_title[:50].lower().replace(' ', '_')}_{current_date}.md",
+                mime="text/markdown",
+                key="final_download"
+            )
+
     with tab4:
         st.header("Chat Assistant")
         st.write("Get current information and help with your blog content from our AI assistant")
@@ -476,8 +3436,22 @@ def main():
         if 'chat_history' not in st.session_state:
             st.session_state.chat_history = []
 
-        # Display chat history
-        for message in st.session_state.chat_history:
+        include_blog = st.checkbox(
+            "Use the current blog as context",
+            value=False,
+            disabled=artifacts.latest("blog") is None,
+            key="chat_include_blog"
+        )
+
+        # Display the most recent chat history, older messages on demand
+        if 'chat_visible' not in st.session_state:
+            st.session_state.chat_visible = CHAT_PAGE_SIZE
+        hidden_count = max(0, len(st.session_state.chat_history) - st.session_state.chat_visible)
+        if hidden_count:
+            if st.button(f"Show older messages ({hidden_count} hidden)"):
+                st.session_state.chat_visible += CHAT_PAGE_SIZE
+                st.rerun()
+        for message in st.session_state.chat_history[hidden_count:]:
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
 
@@ -490,18 +3464,24 @@ def main():
             with st.chat_message("user"):
                 st.markdown(prompt)
 
-            # Generate AI response (without blog context)
             with st.spinner("Thinking..."):
                 try:
+                    blog_artifact = artifacts.latest("blog")
                     response = generator.chat_with_blog(
                         st.session_state.chat_memory,
-                        prompt
+                        prompt,
+                        blog_content=blog_artifact.value if include_blog and blog_artifact else None
                     )
                     st.session_state.chat_history.append({"role": "assistant", "content": response})
                     st.rerun()
                 except Exception as e:
                     st.error(f"An error occurred during chat: {str(e)}")
-        
+
+    # Keep polling while generations run in the background
+    if jobs.jobs(session_id, active_only=True):
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
 
 if __name__ == "__main__":
     main()
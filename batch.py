@@ -0,0 +1,244 @@
+"""Headless batch generation of blog posts from a topic file.
+
+Example:
+    python batch.py topics.csv --out output --workers 4
+
+Topics are read from a CSV file with a ``topic`` column (and optional ``id``
+and ``word_limit`` columns) or from a JSONL file with the same keys. Every
+finished stage is appended to a checkpoint file, so re-running the same
+command after a crash skips the work that was already paid for.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from app import (
+    BlogGenerator, ContentArchive, Instrumentation, JsonlSink, ModelRouter, RateLimiter, ResponseCache, stamp_blog
+)
+
+
+def slugify(text, max_length=60):
+    """Turn a topic into a filesystem friendly identifier"""
+    slug = re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    return slug[:max_length] or "topic"
+
+
+def read_topics(path, default_word_limit=800):
+    """Read topics from a CSV or JSONL file into a list of dicts with unique ids"""
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+    topics = []
+    seen_ids = set()
+    for row in rows:
+        topic = (row.get("topic") or "").strip()
+        if not topic:
+            continue
+        topic_id = str(row.get("id") or slugify(topic))
+        if topic_id in seen_ids:
+            topic_id = f"{topic_id}-{len(topics) + 1}"
+        seen_ids.add(topic_id)
+        topics.append({
+            "id": topic_id,
+            "topic": topic,
+            "word_limit": int(row.get("word_limit") or default_word_limit),
+        })
+    return topics
+
+
+class Checkpoint:
+    """Append-only JSONL record of finished pipeline stages per topic.
+
+    Each entry carries the generation settings it was produced with (model,
+    word limit, long-form), and only entries matching the current settings are
+    reused, so changing the arguments regenerates instead of mixing outputs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.stages = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash can leave a truncated final line behind
+                        continue
+                    self.stages.setdefault(entry["id"], {})[entry["stage"]] = (
+                        entry.get("settings"), entry["output"]
+                    )
+
+    def completed(self, topic_id, settings):
+        """Return the stage outputs already recorded for a topic with these settings"""
+        return {
+            stage: output
+            for stage, (recorded_settings, output) in self.stages.get(topic_id, {}).items()
+            if recorded_settings == settings
+        }
+
+    def record(self, topic_id, stage, output, settings):
+        """Durably record a finished stage"""
+        line = json.dumps(
+            {"id": topic_id, "stage": stage, "settings": settings, "output": output}, ensure_ascii=False
+        )
+        with self._lock:
+            self.stages.setdefault(topic_id, {})[stage] = (settings, output)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class Manifest:
+    """Append-only JSONL manifest with one line per processed topic"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.finished_ids = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if entry.get("status") == "ok":
+                        self.finished_ids.add(entry["id"])
+
+    def write(self, entry):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            if entry.get("status") == "ok":
+                self.finished_ids.add(entry["id"])
+
+
+def process_topic(generator, item, args, checkpoint, archive=None):
+    """Run the pipeline for one topic and write its Markdown output"""
+    settings = {"model": args.model, "word_limit": item["word_limit"], "long_form": args.long_form}
+    completed = checkpoint.completed(item["id"], settings)
+    start = time.perf_counter()
+    results = generator.run_pipeline(
+        item["topic"],
+        word_limit=item["word_limit"],
+        include_qa=not args.no_qa,
+        max_workers=args.stage_workers,
+        completed=completed,
+        on_stage=lambda stage, output, seconds: checkpoint.record(item["id"], stage, output, settings),
+        long_form=args.long_form,
+    )
+
+    if archive is not None:
+        for stage, kind in (("research", "research"), ("titles", "titles"), ("keywords", "keywords"),
+                            ("blog", "post")):
+            title = results["title"] if stage in ("keywords", "blog") else ""
+            archive.save(
+                kind, item["topic"], results[stage], title=title, model=results["models"].get(stage),
+                account=generator.account
+            )
+
+    content = stamp_blog(results["blog"])
+    if results.get("qa"):
+        content += "\n\n" + results["qa"]
+    output_file = os.path.join(args.out, f"{item['id']}.md")
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(content)
+
+    return {
+        "id": item["id"],
+        "topic": item["topic"],
+        "status": "ok",
+        "title": results["title"],
+        "keywords": results["keywords"],
+        "file": output_file,
+        "resumed_stages": sorted(completed),
+        "models": results["models"],
+        "timings": results["timings"],
+        "total_time": time.perf_counter() - start,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate blog posts in bulk from a topic file")
+    parser.add_argument("topics", help="CSV (with a 'topic' column) or JSONL topic file")
+    parser.add_argument("--out", default="output", help="Directory for Markdown files and the manifest")
+    parser.add_argument("--model", default="llama3-70b-8192", help="Groq model name")
+    parser.add_argument("--word-limit", type=int, default=800, help="Default word limit per post")
+    parser.add_argument("--workers", type=int, default=4, help="Topics processed concurrently")
+    parser.add_argument("--stage-workers", type=int, default=2, help="Concurrent stages within a topic")
+    parser.add_argument("--long-form", action="store_true",
+                        help="Outline first and write sections in parallel (for 1500+ word posts)")
+    parser.add_argument("--no-qa", action="store_true", help="Skip the Q&A stage")
+    parser.add_argument("--cache", action="store_true", help="Reuse completions from the on-disk response cache")
+    parser.add_argument("--archive", action="store_true",
+                        help="Add research, titles, keywords and posts to the local searchable archive")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <out>/checkpoint.jsonl)")
+    parser.add_argument("--route", action="store_true",
+                        help="Route cheap stages to a fast model and fall back across models on errors")
+    parser.add_argument("--metrics", help="Append per-call latency/token/cost records to this JSONL file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+    groq_api_key = os.environ.get("GROQ_API_KEY")
+    if not groq_api_key:
+        print("GROQ_API_KEY is not set (export it or add it to a .env file)", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.out, "checkpoint.jsonl"))
+    manifest = Manifest(os.path.join(args.out, "manifest.jsonl"))
+    archive = ContentArchive() if args.archive else None
+
+    topics = read_topics(args.topics, default_word_limit=args.word_limit)
+    todo = [item for item in topics if item["id"] not in manifest.finished_ids]
+    print(f"{len(topics)} topics, {len(topics) - len(todo)} already finished, {len(todo)} to run")
+
+    generator = BlogGenerator(
+        groq_api_key,
+        args.model,
+        cache=ResponseCache() if args.cache else None,
+        limiter=RateLimiter(),
+        metrics=Instrumentation([JsonlSink(args.metrics)]) if args.metrics else None,
+        router=ModelRouter() if args.route else None
+    )
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(process_topic, generator, item, args, checkpoint, archive): item
+            for item in todo
+        }
+        for done_count, future in enumerate(as_completed(futures), 1):
+            item = futures[future]
+            try:
+                entry = future.result()
+                print(f"[{done_count}/{len(todo)}] {item['id']}: done in {entry['total_time']:.1f}s")
+            except Exception as e:
+                failures += 1
+                entry = {"id": item["id"], "topic": item["topic"], "status": "error", "error": str(e)}
+                print(f"[{done_count}/{len(todo)}] {item['id']}: failed ({e})", file=sys.stderr)
+            manifest.write(entry)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
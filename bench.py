@@ -0,0 +1,366 @@
+"""Offline benchmarks for the app's own overhead.
+
+ChatGroq is replaced by a deterministic fake LLM with configurable latency,
+token rate and output size, so the numbers measure BlogGenerator and the
+Streamlit script rather than Groq.
+
+Example:
+    python bench.py --output bench.json
+    python bench.py --compare bench.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Iterator, Optional
+
+import langchain_groq
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Defaults for every FakeChatGroq instance; the app constructs its own clients,
+# so the command line adjusts these instead of constructor arguments
+FAKE_SETTINGS = {"latency": 0.05, "tokens_per_second": 2000.0, "output_tokens": 400}
+FAKE_STATS = Counter()
+_stats_lock = threading.Lock()
+
+
+def fake_text(words):
+    """Deterministic filler words in paragraphs of 40"""
+    tokens = [f"word{i % 50}" for i in range(words)]
+    return "\n\n".join(" ".join(tokens[i:i + 40]) for i in range(0, len(tokens), 40))
+
+
+def fake_completion(prompt, output_tokens):
+    """Deterministic completion shaped like the real output for the prompt"""
+    if "title options" in prompt:
+        return json.dumps({"titles": [f"Fake Title Number {i}" for i in range(1, 6)]})
+    if "Suggest 10-15 relevant keywords" in prompt:
+        return json.dumps({"keywords": [f"keyword {i}" for i in range(1, 13)]})
+    if "Plan a long-form" in prompt:
+        count = int(re.search(r"exactly (\d+) main sections", prompt).group(1))
+        return "\n\n".join(
+            f"## Fake Section {i}\n- First point of section {i}\n- Second point of section {i}"
+            for i in range(1, count + 1)
+        )
+    if "You are writing one section" in prompt:
+        heading = re.search(r"Start with the line: ## (.+)", prompt).group(1).strip()
+        return f"## {heading}\n\n{fake_text(output_tokens // 2)}\n\nSource: [Fake Source](https://example.com/source)"
+    if "You are revising one section" in prompt:
+        heading = re.search(r"Section to rewrite:\s*(## .+)", prompt).group(1).strip()
+        return f"{heading}\n\n{fake_text(output_tokens // 2)}"
+    if "Write the introduction" in prompt or "Write the conclusion" in prompt:
+        return fake_text(150)
+    if "List 2-3 questions" in prompt:
+        return "\n\n".join(f"Q: Fake question {i}?\nA: {fake_text(20)}" for i in range(1, 4))
+    if "Q&A" in prompt or "candidate questions and answers" in prompt:
+        return "## Frequently Asked Questions\n\n" + "\n\n".join(
+            f"### Fake question {i}?\n{fake_text(30)}" for i in range(1, 7)
+        )
+    parts = ["# Fake Post", "## Introduction", fake_text(min(output_tokens, 120))]
+    for start in range(120, output_tokens, 120):
+        parts += [f"## Section {start // 120}", fake_text(min(120, output_tokens - start))]
+    return "\n\n".join(parts)
+
+
+class FakeChatGroq(BaseChatModel):
+    """Drop-in stand-in for ChatGroq that never touches the network"""
+
+    model_name: str = "fake"
+    temperature: float = 0.7
+    groq_api_key: Optional[str] = None
+    max_retries: int = 2
+    latency: float = None
+    tokens_per_second: float = None
+    output_tokens: int = None
+
+    def __init__(self, **kwargs: Any):
+        for name, value in FAKE_SETTINGS.items():
+            kwargs.setdefault(name, value)
+        super().__init__(**kwargs)
+        with _stats_lock:
+            FAKE_STATS["clients"] += 1
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-groq"
+
+    def _completion(self, messages):
+        prompt = messages[-1].content
+        text = fake_completion(prompt, self.output_tokens)
+        with _stats_lock:
+            FAKE_STATS["calls"] += 1
+        return prompt, text
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt, text = self._completion(messages)
+        time.sleep(self.latency + len(text.split()) / self.tokens_per_second)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text.split())}
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text))],
+            llm_output={"token_usage": usage, "model_name": self.model_name},
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        _, text = self._completion(messages)
+        time.sleep(self.latency)
+        for word in text.split(" "):
+            time.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+# Patch before the app is imported or run so every ChatGroq it creates is fake
+langchain_groq.ChatGroq = FakeChatGroq
+
+import app  # noqa: E402
+
+
+def timed_ms(fn, repeats):
+    """Mean wall time of fn() in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+def llm_delta(fn):
+    """Run fn() and return (result, LLM calls made)"""
+    calls = FAKE_STATS["calls"]
+    result = fn()
+    return result, FAKE_STATS["calls"] - calls
+
+
+def bench_construction(repeats):
+    pool = app.GeneratorPool()
+    pool.get("bench-key", "fake")
+    generator = app.BlogGenerator("bench-key", "fake")
+    titles = fake_completion("title options", 0)
+    titles_schema = app.STRUCTURED_OUTPUT_SCHEMAS["titles"]
+    return {
+        "generator_init_ms": timed_ms(lambda: app.BlogGenerator("bench-key", "fake"), repeats),
+        "pooled_generator_ms": timed_ms(lambda: pool.get("bench-key", "fake"), repeats),
+        "chain_build_ms": timed_ms(lambda: (generator._chains.clear(), generator._chain("blog")), repeats),
+        "parse_titles_ms": timed_ms(lambda: app.parse_structured_list(titles, titles_schema), repeats * 10),
+    }
+
+
+def bench_methods(repeats):
+    generator = app.BlogGenerator("bench-key", "fake")
+    post = fake_completion("blog", FAKE_SETTINGS["output_tokens"])
+    calls = {
+        "research_content": lambda: generator.research_content("electric vehicles"),
+        "generate_titles": lambda: generator.generate_titles("electric vehicles"),
+        "generate_keywords": lambda: generator.generate_keywords("Fake Title Number 1"),
+        "generate_blog": lambda: generator.generate_blog("Fake Title Number 1", "keyword 1", 800),
+        "generate_qa": lambda: generator.generate_qa(post),
+        "stream_blog": lambda: list(generator.stream_blog("Fake Title Number 1", "keyword 1", 800)),
+        # Long enough for the map-reduce path on the default context window
+        "generate_qa_long": lambda: generator.generate_qa(fake_completion("blog", 4000)),
+        "generate_long_blog": lambda: generator.generate_long_blog(
+            "Fake Title Number 1", "keyword 1", 3000, research=fake_completion("research", 400)
+        ),
+        "regenerate_section": lambda: generator.regenerate_section(post, 2, instructions="make it shorter"),
+    }
+    results = {}
+    for name, fn in calls.items():
+        # Parallel methods overlap fake calls, so wall time minus the fake latency is not
+        # the app's own work; CPU time of the process is, sequential or not
+        wall_ms = cpu_ms = llm_calls = 0
+        for _ in range(repeats):
+            cpu_start = time.process_time()
+            start = time.perf_counter()
+            _, made = llm_delta(fn)
+            wall_ms += (time.perf_counter() - start) * 1000
+            cpu_ms += (time.process_time() - cpu_start) * 1000
+            llm_calls += made
+        results[name] = {
+            "wall_ms": wall_ms / repeats,
+            "cpu_ms": cpu_ms / repeats,
+            "llm_calls": llm_calls / repeats,
+        }
+    return results
+
+
+def bench_pipeline(topics, workers, stage_workers):
+    generator = app.BlogGenerator("bench-key", "fake")
+
+    def run_all():
+        with app.ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(
+                lambda i: generator.run_pipeline(f"topic {i}", max_workers=stage_workers),
+                range(topics)
+            ))
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    _, llm_calls = llm_delta(run_all)
+    elapsed = time.perf_counter() - start
+    return {
+        "topics": topics,
+        "wall_ms": elapsed * 1000,
+        "cpu_ms": (time.process_time() - cpu_start) * 1000,
+        "posts_per_min": topics * 60 / elapsed,
+        "llm_calls": llm_calls,
+    }
+
+
+def bench_app(idle_reruns, chat_messages):
+    """Drive app.py through AppTest and measure each interaction"""
+    from streamlit.testing.v1 import AppTest
+
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    at = AppTest.from_file(app_path, default_timeout=120)
+
+    def button(label):
+        return next(b for b in at.button if b.label == label)
+
+    interactions = [
+        ("first_paint", lambda: at.run()),
+        ("enter_api_key", lambda: at.sidebar.text_input[0].input("bench-key").run()),
+        ("enter_topic", lambda: at.text_input[0].input("electric vehicles").run()),
+        ("research", lambda: button("Research Topic").click().run()),
+        ("titles", lambda: button("Generate Title Suggestions").click().run()),
+        ("keywords", lambda: button("Suggest Keywords").click().run()),
+        ("blog", lambda: button("Generate Blog Post").click().run()),
+        ("qa", lambda: button("Generate Q&A Section").click().run()),
+    ]
+    for i in range(idle_reruns):
+        interactions.append((f"idle_rerun_{i + 1}", lambda: at.run()))
+
+    def long_chat_rerun():
+        at.session_state["chat_history"] = [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " * 40}
+            for i in range(chat_messages)
+        ]
+        at.run()
+
+    interactions.append(("rerun_with_long_chat", long_chat_rerun))
+
+    results = {}
+    tracemalloc.start()
+    for name, interact in interactions:
+        tracemalloc.reset_peak()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        _, llm_calls = llm_delta(interact)
+        wall_ms = (time.perf_counter() - wall_start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].value}")
+        results[name] = {
+            "wall_ms": wall_ms,
+            "cpu_ms": (time.process_time() - cpu_start) * 1000,
+            "peak_mb": peak / 1024 / 1024,
+            "llm_calls": llm_calls,
+        }
+    tracemalloc.stop()
+    return results
+
+
+def flatten(data, prefix=""):
+    """Flatten nested results into {"a.b.c": number}"""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current, max_regression):
+    """Print metric changes and return the names of regressions beyond the threshold"""
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    regressions = []
+    for name in sorted(old.keys() & new.keys()):
+        if old[name] == 0:
+            continue
+        change = (new[name] - old[name]) / abs(old[name])
+        # Throughput is the only higher-is-better metric
+        worse = -change if name.endswith("per_min") else change
+        flag = ""
+        if worse > max_regression:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name}: {old[name]:.3f} -> {new[name]:.3f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app against a fake Groq backend")
+    parser.add_argument("--latency", type=float, default=FAKE_SETTINGS["latency"],
+                        help="Fake seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=FAKE_SETTINGS["tokens_per_second"],
+                        help="Fake generation speed")
+    parser.add_argument("--output-tokens", type=int, default=FAKE_SETTINGS["output_tokens"],
+                        help="Fake completion length for long-form stages")
+    parser.add_argument("--repeats", type=int, default=5, help="Repetitions for micro benchmarks")
+    parser.add_argument("--topics", type=int, default=8, help="Topics for the pipeline throughput run")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent topics in the pipeline run")
+    parser.add_argument("--stage-workers", type=int, default=2, help="Concurrent stages within a topic")
+    parser.add_argument("--idle-reruns", type=int, default=3, help="Reruns without interaction in the app run")
+    parser.add_argument("--chat-messages", type=int, default=200, help="Chat history size for the last rerun")
+    parser.add_argument("--skip-app", action="store_true", help="Skip the Streamlit AppTest scenario")
+    parser.add_argument("--output", help="Write results to this JSON file instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Relative slowdown that fails --compare (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    FAKE_SETTINGS.update(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+    )
+
+    results = {
+        "construction": bench_construction(args.repeats),
+        "methods": bench_methods(args.repeats),
+        "pipeline": bench_pipeline(args.topics, args.workers, args.stage_workers),
+    }
+    if not args.skip_app:
+        results["app"] = bench_app(args.idle_reruns, args.chat_messages)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "fake_llm": dict(FAKE_SETTINGS),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.max_regression)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.max_regression:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Opt-in import-time profiling for the app.
+
+Set ``BLOGGER_IMPORT_PROFILE=1`` before starting Streamlit to record how long
+every module import takes, in the spirit of ``python -X importtime``. The
+profiler lives in its own module so it is installed once per process and keeps
+recording across Streamlit reruns, including the LangChain/Groq imports that
+only happen when the first generation is requested.
+"""
+import builtins
+import os
+import sys
+import threading
+import time
+
+ENV_FLAG = "BLOGGER_IMPORT_PROFILE"
+
+
+class ImportProfiler:
+    """Times first imports of modules with self and cumulative durations"""
+
+    def __init__(self):
+        self.records = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._original_import = None
+
+    def enable(self):
+        if self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._import
+
+    def disable(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        # Child import time is added to the parent's entry, as -X importtime does
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            with self._lock:
+                self.records.append((name, cumulative - children, cumulative, len(stack)))
+
+    def report(self, min_cumulative=0.0):
+        """Text table in -X importtime layout (children before parents, microseconds)"""
+        with self._lock:
+            records = list(self.records)
+        lines = ["import time: self [us] | cumulative | imported package"]
+        for name, self_time, cumulative, depth in records:
+            if cumulative < min_cumulative:
+                continue
+            lines.append(f"import time: {self_time * 1e6:9.0f} | {cumulative * 1e6:10.0f} | {'  ' * depth}{name}")
+        return "\n".join(lines)
+
+    def slowest(self, limit=10):
+        """Top-level imports with the largest cumulative time, as (name, seconds)"""
+        with self._lock:
+            top = [(r[0], r[2]) for r in self.records if r[3] == 0]
+        return sorted(top, key=lambda r: r[1], reverse=True)[:limit]
+
+    def total_seconds(self):
+        """Time spent in top-level imports since profiling was enabled"""
+        with self._lock:
+            return sum(r[2] for r in self.records if r[3] == 0)
+
+
+_profiler = None
+
+
+def enable():
+    """Install the process-wide profiler and return it"""
+    global _profiler
+    if _profiler is None:
+        _profiler = ImportProfiler()
+        _profiler.enable()
+    return _profiler
+
+
+def active_profiler():
+    """The installed profiler, or None when profiling is off"""
+    return _profiler
+
+
+def enable_from_env():
+    """Install the profiler when the environment flag is set"""
+    if os.environ.get(ENV_FLAG, "").lower() in ("1", "true", "yes"):
+        return enable()
+    return None
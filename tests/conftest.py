@@ -0,0 +1,5 @@
+import os
+import sys
+
+# app.py imports its sibling modules the way `streamlit run` finds them, from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
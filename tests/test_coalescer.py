@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from app import RequestCoalescer
+
+KEY = RequestCoalescer.make_key("run", "account", "model", 0.7, "blog", {"title": "Electric Vehicles"})
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for callers to attach")
+        time.sleep(0.005)
+
+
+def run_followers(coalescer, fn, count):
+    """Start ``count`` callers of ``coalescer.run`` and return their outcomes once all have attached"""
+    outcomes = [None] * count
+
+    def follow(i):
+        try:
+            outcomes[i] = coalescer.run(KEY, fn, stage="blog")
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=follow, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: coalescer.saved["blog"] == count - 1)
+    return threads, outcomes
+
+
+def test_make_key_ignores_case_and_whitespace_but_not_account():
+    same = RequestCoalescer.make_key("run", "account", "model", 0.7, "blog", {"title": "  electric   VEHICLES "})
+    other_account = RequestCoalescer.make_key("run", "other", "model", 0.7, "blog", {"title": "Electric Vehicles"})
+    assert same == KEY
+    assert other_account != KEY
+
+
+def test_run_fans_the_leader_result_out_to_followers():
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "post"
+
+    threads, outcomes = run_followers(coalescer, fn, 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(outcomes, key=lambda outcome: outcome[1]) == [("post", False)] + [("post", True)] * 3
+    assert coalescer.stats() == {"blog": {"calls": 1, "saved": 3}}
+
+
+def test_run_propagates_the_leader_error_to_followers():
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+    error = RuntimeError("rate limited")
+
+    def fn():
+        release.wait(5)
+        raise error
+
+    threads, outcomes = run_followers(coalescer, fn, 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert outcomes == [error] * 3
+    # The failed call is not kept, so the next caller tries again
+    assert coalescer.run(KEY, lambda: "retry", stage="blog") == ("retry", False)
+
+
+def test_stream_fans_chunks_out_to_every_reader():
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+    starts = []
+
+    def start_fn():
+        starts.append(1)
+        release.wait(5)
+        yield "one "
+        yield "two"
+        return "summary"
+
+    leader_chunks, leader_call, leader_shared = coalescer.stream(KEY, start_fn, stage="blog")
+    follower_chunks, follower_call, follower_shared = coalescer.stream(KEY, start_fn, stage="blog")
+    release.set()
+
+    assert list(leader_chunks) == ["one ", "two"]
+    assert list(follower_chunks) == ["one ", "two"]
+    assert (leader_shared, follower_shared) == (False, True)
+    assert follower_call is leader_call and leader_call.value == "summary"
+    assert len(starts) == 1
+
+
+def test_stream_raises_the_producer_error_after_the_chunks_so_far():
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+
+    def start_fn():
+        release.wait(5)
+        yield "partial"
+        raise RuntimeError("connection reset")
+
+    readers = [coalescer.stream(KEY, start_fn, stage="blog")[0] for _ in range(2)]
+    release.set()
+
+    for chunks in readers:
+        assert next(chunks) == "partial"
+        with pytest.raises(RuntimeError, match="connection reset"):
+            next(chunks)
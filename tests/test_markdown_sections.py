@@ -0,0 +1,55 @@
+from app import replace_section, split_markdown_sections
+
+POST = """# Electric Vehicles in 2026
+
+An introduction to the topic.
+
+## Battery Prices
+
+Prices kept falling.
+
+### Solid State
+
+Still a few years out.
+
+## Charging
+
+```bash
+## not a heading inside a code block
+```
+
+Networks keep growing.
+
+## Conclusion
+
+Wrap-up.
+"""
+
+
+def test_split_keeps_every_line_and_ignores_code_blocks():
+    sections = split_markdown_sections(POST, levels=(2,))
+
+    assert [section.split("\n", 1)[0] for section in sections] == [
+        "# Electric Vehicles in 2026", "## Battery Prices", "## Charging", "## Conclusion"
+    ]
+    assert "\n".join(sections) == POST
+
+
+def test_split_starts_sections_at_h3_when_asked():
+    headings = [section.split("\n", 1)[0] for section in split_markdown_sections(POST)]
+    assert "### Solid State" in headings
+
+
+def test_replacing_a_section_with_itself_is_a_no_op():
+    for index, section in enumerate(split_markdown_sections(POST, levels=(2,))):
+        assert replace_section(POST, index, section) == POST
+
+
+def test_replace_section_splices_in_place_and_keeps_the_spacing():
+    updated = replace_section(POST, 2, "## Charging\n\nFast chargers doubled.\n\n\n")
+
+    assert updated == POST.replace(
+        "```bash\n## not a heading inside a code block\n```\n\nNetworks keep growing.",
+        "Fast chargers doubled."
+    )
+    assert split_markdown_sections(updated, levels=(2,))[2] == "## Charging\n\nFast chargers doubled.\n"
@@ -0,0 +1,41 @@
+import threading
+import time
+
+from app import RateLimiter
+
+LIMITS = {"model": {"requests_per_minute": 600, "tokens_per_minute": 6000}}
+
+
+def test_waiting_callers_are_served_in_arrival_order():
+    limiter = RateLimiter(limits=LIMITS)
+    # Empty the token bucket; it refills at 100 tokens a second
+    limiter.acquire("model", 6000)
+    served = []
+
+    def acquire(name, tokens):
+        limiter.acquire("model", tokens)
+        served.append(name)
+
+    # The small requests would fit long before the large one, but arrived after it
+    threads = []
+    for name, tokens in [("large", 30), ("small", 1), ("tiny", 1)]:
+        thread = threading.Thread(target=acquire, args=(name, tokens))
+        thread.start()
+        threads.append(thread)
+        deadline = time.monotonic() + 5
+        while limiter._next_ticket[(None, "model")] < len(threads) + 1 and time.monotonic() < deadline:
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+
+    assert served == ["large", "small", "tiny"]
+    assert limiter.stats()["model"]["requests"] == 4
+
+
+def test_accounts_do_not_share_a_budget():
+    limiter = RateLimiter(limits=LIMITS)
+    limiter.acquire("model", 6000, account="busy")
+
+    start = time.monotonic()
+    limiter.acquire("model", 1000, account="idle")
+    assert time.monotonic() - start < 0.5
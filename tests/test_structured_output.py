@@ -0,0 +1,44 @@
+import pytest
+
+from app import STRUCTURED_OUTPUT_SCHEMAS, parse_structured_list, recover_structured_list
+
+TITLES = STRUCTURED_OUTPUT_SCHEMAS["titles"]
+KEYWORDS = STRUCTURED_OUTPUT_SCHEMAS["keywords"]
+
+
+def test_parse_ignores_fences_and_surrounding_text():
+    text = 'Sure! Here you go:\n```json\n{"titles": ["EVs in 2026", " Charging Myths ", "EVs in 2026", ""]}\n```'
+    assert parse_structured_list(text, TITLES) == ["EVs in 2026", "Charging Myths"]
+
+
+def test_parse_cuts_items_beyond_max_items():
+    text = '{"titles": ["a", "b", "c", "d", "e", "f", "g"]}'
+    assert parse_structured_list(text, TITLES) == ["a", "b", "c", "d", "e"]
+
+
+@pytest.mark.parametrize("text, problem", [
+    ("no json here", "no JSON object"),
+    ('{"titles": ["a", "b",]}', "invalid JSON"),
+    ('{"headlines": ["a"]}', '"titles" key'),
+    ('{"titles": "a, b"}', "list of strings"),
+    ('{"titles": ["  "]}', "at least 1"),
+])
+def test_parse_rejects_malformed_answers(text, problem):
+    with pytest.raises(ValueError, match=problem):
+        parse_structured_list(text, TITLES)
+
+
+def test_recover_reads_items_from_a_trailing_comma():
+    assert recover_structured_list('{"titles": ["EVs in 2026", "Charging Myths",]}', TITLES) == [
+        "EVs in 2026", "Charging Myths"
+    ]
+
+
+def test_recover_reads_items_from_a_truncated_answer():
+    text = '```json\n{"keywords": ["electric cars", "ev \\"range\\" anxiety", "charging'
+    assert recover_structured_list(text, KEYWORDS) == ["electric cars", 'ev "range" anxiety']
+
+
+def test_recover_returns_nothing_without_the_list():
+    assert recover_structured_list('{"keywords": "electric cars, charging"}', KEYWORDS) == []
+    assert recover_structured_list("electric cars, charging", KEYWORDS) == []